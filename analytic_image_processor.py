@@ -12,11 +12,48 @@ PARAM1_HOUGH = 30   #50 or 40
 PARAM2_HOUGH = 40     #120 or 70
 MIN_RADIUS_HOUGH = 200  #350
 MAX_RADIUS_HOUGH = 500  #500
+PYRAMID_LEVELS = 2
+MIN_PARAM2_HOUGH_COARSE = 10
+REFINE_RADIUS_BAND = 0.05
+MIN_REFINE_BAND_PX = 8
+
+
+def calculate_internal_radius(radius_arena, central_radius):
+    return round((radius_arena - central_radius) / 3 + central_radius)
+
+
+def calculate_middle_radius(radius_arena, central_radius):
+    return round(2 * (radius_arena - central_radius) / 3 + central_radius)
+
+
+def build_info_arena(x_center, y_center, radius_arena, central_radius) -> dict:
+    internal_radius = calculate_internal_radius(radius_arena, central_radius)
+    middle_radius = calculate_middle_radius(radius_arena, central_radius)
+    return {
+        'x_center': x_center,
+        'y_center': y_center,
+        'radius_arena': radius_arena,
+        'central_zone': (0, central_radius),
+        'internal_zone': (central_radius, internal_radius),
+        'middle_zone': (internal_radius, middle_radius),
+        'outer_zone': (middle_radius, radius_arena)
+    }
+
+
+# Median of the geometry found on several frames; the zones are rebuilt from the median radii
+def median_info_arena(infos_arena: list) -> dict:
+    if not infos_arena:
+        raise ValueError("[ERROR]: The arena was not found on any frame")
+    return build_info_arena(*[int(np.median([info[key] for info in infos_arena]))
+                              for key in ('x_center', 'y_center', 'radius_arena')],
+                            int(np.median([info['central_zone'][1] for info in infos_arena])))
 
 
 class AnalyticImageProcessor:
-    def __init__(self, image: np.ndarray):
+    def __init__(self, image: np.ndarray, multi_scale: bool = False):
         self.image = image
+        self.multi_scale = multi_scale
+        self.contour_keypoints_of_arena = None
         self.gray_image = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
         self.blurred_image = cv2.GaussianBlur(self.gray_image, (5, 5), 0)
 
@@ -29,6 +66,11 @@ class AnalyticImageProcessor:
         self.outer_zone = None
 
     def search_contour_keypoints_of_arena(self):
+        if self.contour_keypoints_of_arena is None:
+            self.contour_keypoints_of_arena = self.find_contour_keypoints_of_arena()
+        return self.contour_keypoints_of_arena
+
+    def find_contour_keypoints_of_arena(self):
         x_roi = int(self.blurred_image.shape[1] * COEFF_FOR_XY_ROI)
         y_roi = int(self.blurred_image.shape[0] * COEFF_FOR_XY_ROI)
         w_roi = int(self.blurred_image.shape[0] * COEFF_FOR_WH_ROI)
@@ -50,9 +92,53 @@ class AnalyticImageProcessor:
         return contour_keypoints_of_arena
 
     def search_contour_of_arena(self):
+        if self.multi_scale:
+            return self.search_contour_of_arena_multi_scale()
+        return self.search_contour_of_arena_single_scale()
+
+    # Hough on a downscaled pyramid level finds the circle roughly, then Hough at full resolution
+    # refines it in a crop around the rough circle within a narrow radius band
+    def search_contour_of_arena_multi_scale(self):
+        scale = 2 ** PYRAMID_LEVELS
+        small_image = self.gray_image
+        for _ in range(PYRAMID_LEVELS):
+            small_image = cv2.pyrDown(small_image)
+
+        coarse_circle = cv2.HoughCircles(
+            small_image, cv2.HOUGH_GRADIENT, DP_HOUGH, MIN_DIST_HOUGH / scale, param1=PARAM1_HOUGH,
+            param2=max(MIN_PARAM2_HOUGH_COARSE, PARAM2_HOUGH / scale),
+            minRadius=MIN_RADIUS_HOUGH // scale, maxRadius=MAX_RADIUS_HOUGH // scale)
+        if coarse_circle is None:
+            return self.search_contour_of_arena_single_scale()
+
+        x_coarse, y_coarse, radius_coarse = coarse_circle[0, 0] * scale
+        band = max(MIN_REFINE_BAND_PX, radius_coarse * REFINE_RADIUS_BAND)
+        min_radius = int(radius_coarse - band)
+        max_radius = int(radius_coarse + band) + 1
+        half_side = max_radius + int(band)
+        x_roi = max(0, int(x_coarse) - half_side)
+        y_roi = max(0, int(y_coarse) - half_side)
+        roi = self.gray_image[y_roi: int(y_coarse) + half_side, x_roi: int(x_coarse) + half_side]
+
+        detected_circle = cv2.HoughCircles(
+            roi, cv2.HOUGH_GRADIENT, DP_HOUGH, 2 * max_radius, param1=PARAM1_HOUGH,
+            param2=PARAM2_HOUGH, minRadius=min_radius, maxRadius=max_radius)
+        if detected_circle is None:
+            x_center, y_center, radius = int(x_coarse), int(y_coarse), int(radius_coarse)
+        else:
+            x_center = int(detected_circle[0, 0][0]) + x_roi
+            y_center = int(detected_circle[0, 0][1]) + y_roi
+            radius = int(detected_circle[0, 0][2])
+
+        self.radius_arena = radius
+        return x_center, y_center, radius
+
+    def search_contour_of_arena_single_scale(self):
         detected_circle = cv2.HoughCircles(
             self.gray_image, cv2.HOUGH_GRADIENT, DP_HOUGH, MIN_DIST_HOUGH, param1=PARAM1_HOUGH,
             param2=PARAM2_HOUGH, minRadius=MIN_RADIUS_HOUGH, maxRadius=MAX_RADIUS_HOUGH)
+        if detected_circle is None:
+            raise ValueError("[ERROR]: The arena circle was not found")
 
         x_center, y_center = int(detected_circle[0, 0][0]), int(detected_circle[0, 0][1])
         radius = int(detected_circle[0, 0][2])
@@ -103,11 +189,11 @@ class AnalyticImageProcessor:
         return x_center, y_center, dist
 
     def search_internal_zone(self):
-        radius = round((self.radius_arena - self.central_zone[1]) / 3 + self.central_zone[1])
+        radius = calculate_internal_radius(self.radius_arena, self.central_zone[1])
         self.internal_zone = (self.central_zone[1], radius)
 
     def search_middle_zone(self):
-        radius = round(2 * (self.radius_arena - self.central_zone[1]) / 3 + self.central_zone[1])
+        radius = calculate_middle_radius(self.radius_arena, self.central_zone[1])
         self.middle_zone = (self.internal_zone[1], radius)
 
     def search_outer_zone(self):
@@ -119,6 +205,17 @@ class AnalyticImageProcessor:
         self.search_middle_zone()
         self.search_outer_zone()
 
+    def get_info_arena(self) -> dict:
+        return {
+            'x_center': self.x_center,
+            'y_center': self.y_center,
+            'radius_arena': self.radius_arena,
+            'central_zone': self.central_zone,
+            'internal_zone': self.internal_zone,
+            'middle_zone': self.middle_zone,
+            'outer_zone': self.outer_zone
+        }
+
     def draw_zones(self, image: np.ndarray) -> np.ndarray:
         image = cv2.circle(image, (self.x_center, self.y_center), 2, (0, 0, 255), -1)
         image = cv2.circle(image, (self.x_center, self.y_center), self.central_zone[1], (0, 0, 255), 2)
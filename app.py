@@ -1,6 +1,8 @@
 import streamlit as st
 import os
 from mouse_detector import MouseDetector
+from model_registry import MODEL_REGISTRY, BACKENDS
+from session_export import find_session_data, read_session_data, export_excel
 import time
 import pandas as pd
 import cv2
@@ -69,6 +71,12 @@ if 'do_plot_graphs' not in st.session_state:
     st.session_state.do_plot_graphs = True
 if 'uploaded_file_name' not in st.session_state:
     st.session_state.uploaded_file_name = None
+if 'backend' not in st.session_state:
+    st.session_state.backend = 'torch'
+if 'run_report' not in st.session_state:
+    st.session_state.run_report = None
+if 'excel_path' not in st.session_state:
+    st.session_state.excel_path = None
 
 st.title("Mouse Detector")
 
@@ -99,19 +107,36 @@ with col1:
 with col2:
     st.session_state.do_plot_graphs = st.checkbox("Создать графики анализа", value=st.session_state.do_plot_graphs, key='plots_checkbox')
 
+st.session_state.backend = st.selectbox("Бэкенд инференса", BACKENDS, index=BACKENDS.index(st.session_state.backend), key='backend_selectbox')
+
+PATH_TO_WEIGHT_YOLO = "weights/weights_yolo.pt"
+PATH_TO_BEHAVIOR_WEIGHT_YOLO = "weights/behavior_weights_yolo.pt"
+
 def run_analysis():
     try:
-        # Run detection
-        mouse_detector = MouseDetector(
-            st.session_state.video_path,
-            "weights/weights_yolo.pt",
-            "weights/behavior_weights_yolo.pt",
-            st.session_state.do_output_video,
-            st.session_state.do_plot_graphs
-        )
-        start = time.time()
-        mouse_detector.detect()
-        end = time.time()
+        # Models are loaded and warmed up once per server process and shared between runs
+        pose_entry = MODEL_REGISTRY.get_entry(PATH_TO_WEIGHT_YOLO, st.session_state.backend, 'pose')
+        behavior_entry = MODEL_REGISTRY.get_entry(PATH_TO_BEHAVIOR_WEIGHT_YOLO, st.session_state.backend, 'classify')
+        with pose_entry.lock, behavior_entry.lock:
+            # Run detection
+            mouse_detector = MouseDetector(
+                st.session_state.video_path,
+                PATH_TO_WEIGHT_YOLO,
+                PATH_TO_BEHAVIOR_WEIGHT_YOLO,
+                st.session_state.do_output_video,
+                st.session_state.do_plot_graphs,
+                backend=pose_entry.backend,
+                # The plots are only shown on the page, so they are rendered at screen resolution
+                plot_profile='preview',
+                do_decimate_plots=True,
+                model=pose_entry.model,
+                behavior_model=behavior_entry.model
+            )
+            start = time.time()
+            mouse_detector.detect()
+            end = time.time()
+        st.session_state.run_report = mouse_detector.run_report
+        st.session_state.excel_path = None
         st.session_state.analysis_complete = True
         st.success(f"Анализ выполнен за {end - start:.2f} секунд(-ы)!")
     except Exception as e:
@@ -129,24 +154,37 @@ if st.session_state.analysis_complete and st.session_state.video_path:
     st.header("Результаты анализа")
     video_name = Path(st.session_state.video_path).stem
     
-    # Excel data
-    excel_path = f"mouse_data/{video_name}_data.xlsx"
-    if os.path.exists(excel_path):
-        df = pd.read_excel(excel_path)
+    # Session data
+    session_data_path, session_data_format = find_session_data(video_name)
+    if session_data_path is not None:
+        df = read_session_data(session_data_path, session_data_format)
         st.subheader("Первые 20 строк данных")
         st.dataframe(df.head(20))
         
         col1, col2 = st.columns(2)
         with col1:
-            with open(excel_path, "rb") as file:
-                excel_data = file.read()
+            with open(session_data_path, "rb") as file:
                 st.download_button(
-                    label="Скачать данные в Excel",
-                    data=excel_data,
-                    file_name=f"{video_name}_data.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    key='excel_download'
+                    label=f"Скачать данные ({session_data_format})",
+                    data=file.read(),
+                    file_name=os.path.basename(session_data_path),
+                    mime="application/octet-stream",
+                    key='session_data_download'
                 )
+
+            # Writing the workbook is slow, so it is built only on request
+            if st.button("Подготовить Excel", key='excel_prepare_button'):
+                with st.spinner("Готовим Excel..."):
+                    st.session_state.excel_path = export_excel(video_name)
+            if st.session_state.excel_path and os.path.exists(st.session_state.excel_path):
+                with open(st.session_state.excel_path, "rb") as file:
+                    st.download_button(
+                        label="Скачать данные в Excel",
+                        data=file.read(),
+                        file_name=f"{video_name}_data.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        key='excel_download'
+                    )
     
     # CSV data
     csv_path = f"{video_name}_static.csv"
@@ -162,6 +200,12 @@ if st.session_state.analysis_complete and st.session_state.video_path:
                     key='csv_download'
                 )
 
+    # Run profile
+    if st.session_state.run_report:
+        with st.expander("Время выполнения по этапам"):
+            stages = pd.DataFrame(st.session_state.run_report['stages']).T
+            st.dataframe(stages[['count', 'total_s', 'mean_ms', 'p95_ms', 'fps']])
+
     # Display debug video if generated
     directory = os.path.dirname(st.session_state.video_path)
     filename = os.path.basename(st.session_state.video_path)
@@ -213,12 +257,20 @@ st.sidebar.info("""
 3. Дождитесь результатов анализа
 """)
 
+models_stats = MODEL_REGISTRY.stats()
+if models_stats:
+    with st.sidebar.expander("Загруженные модели"):
+        for stats in models_stats:
+            st.write(f"{os.path.basename(stats['path'])} ({stats['backend']}): загрузка {stats['load_time']:.2f} с, "
+                     f"прогрев {stats['warmup_time']:.2f} с, запусков {stats['requests']}")
+
 st.sidebar.error("ВАЖНО: после получения результатов НЕ ОБНОВЛЯТЬ СТРАНИЦУ, иначе результаты будут потеряны!")
 
 st.sidebar.subheader("Доступные функции:")
 st.sidebar.write("""
 - <<Создать отладочное видео>> - накладывает на исходный видеоролик найденные ключевые точки мыши и зоны арены, нужно для проверки работоспособности алгоритма
 - <<Создать графики анализа>> - создает графики анализа на основе полученных данных.
+- <<Бэкенд инференса>> - torch, onnx или openvino; модели onnx/openvino экспортируются при первом запуске и сохраняются рядом с весами.
 - <<Скачать данные в Excel>> - скачивает данные анализа в формате Excel.
 - <<Скачать данные в CSV>> - скачивает данные анализа в формате CSV.
 - <<Скачать отладочное видео>> - скачивает отладочное видео.
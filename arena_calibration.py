@@ -0,0 +1,177 @@
+import json
+import os
+import time
+
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+DEFAULT_CALIBRATION_PATH = os.path.join('mouse_data', 'arena_calibration.json')
+HASH_SIZE = 16
+MAX_HASH_DISTANCE = 24
+COUNT_CIRCLE_POINTS = 360
+EDGE_BAND_PX = 3
+MIN_EDGE_RATIO = 0.75
+ZONES = ('central_zone', 'internal_zone', 'middle_zone', 'outer_zone')
+LOCK_RETRY_SECONDS = 0.05
+
+
+# Exclusive lock on a sidecar file, held by one process at a time; flock on POSIX, msvcrt on Windows
+@contextmanager
+def lock_file(path: str):
+    with open(path, 'a+') as file:
+        if os.name == 'nt':
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(LOCK_RETRY_SECONDS)
+            try:
+                yield
+            finally:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+# Difference hash of the downsampled gray frame: the static background of the rig decides most of the bits,
+# the mouse covers too few cells of the grid to change many of them
+def compute_fingerprint(frame: np.ndarray) -> str:
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return np.packbits(bits).tobytes().hex()
+
+
+def hamming_distance(fingerprint_a: str, fingerprint_b: str) -> int:
+    bytes_a = np.frombuffer(bytes.fromhex(fingerprint_a), dtype=np.uint8)
+    bytes_b = np.frombuffer(bytes.fromhex(fingerprint_b), dtype=np.uint8)
+    if len(bytes_a) != len(bytes_b):
+        return HASH_SIZE * HASH_SIZE
+    return int(np.unpackbits(bytes_a ^ bytes_b).sum())
+
+
+def compute_edge_image(frame: np.ndarray) -> np.ndarray:
+    gray = cv2.GaussianBlur(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+    grad_x = cv2.Sobel(gray, cv2.CV_32F, 1, 0)
+    grad_y = cv2.Sobel(gray, cv2.CV_32F, 0, 1)
+    return cv2.magnitude(grad_x, grad_y)
+
+
+# Mean over the circle of the strongest gradient across a thin radial band, so a thick border
+# or a jitter of a couple of pixels does not change the value; the points outside the frame are skipped
+def measure_edge_strength(edges: np.ndarray, x_center: float, y_center: float, radius: float) -> float:
+    angles = np.linspace(0, 2 * np.pi, COUNT_CIRCLE_POINTS, endpoint=False)
+    radii = radius + np.arange(-EDGE_BAND_PX, EDGE_BAND_PX + 1)[:, None]
+    xs = np.round(x_center + radii * np.cos(angles)).astype(np.int64)
+    ys = np.round(y_center + radii * np.sin(angles)).astype(np.int64)
+    inside = ((xs >= 0) & (xs < edges.shape[1]) & (ys >= 0) & (ys < edges.shape[0])).all(axis=0)
+    if not inside.any():
+        return 0.0
+    return float(edges[ys[:, inside], xs[:, inside]].max(axis=0).mean())
+
+
+class ArenaCalibrationStore:
+    def __init__(self, path: str = DEFAULT_CALIBRATION_PATH, max_hash_distance: int = MAX_HASH_DISTANCE,
+                 min_edge_ratio: float = MIN_EDGE_RATIO):
+        self.path = path
+        self.max_hash_distance = max_hash_distance
+        self.min_edge_ratio = min_edge_ratio
+        self.status = None
+        self.hash_distance = None
+        self.edge_ratio = None
+
+    def load_entries(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as file:
+            return json.load(file).get('arenas', [])
+
+    # Written to a temporary file and renamed, so a lookup never reads a half-written store.
+    # Writers go through save_arena, which holds the lock of the store for the whole read-modify-write
+    def save_entries(self, entries: list):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        path_tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(path_tmp, 'w') as file:
+            json.dump({'arenas': entries}, file, indent=4)
+        os.replace(path_tmp, self.path)
+
+    def find_entry(self, entries: list, fingerprint: str, resolution: list):
+        best_entry, best_distance = None, None
+        for entry in entries:
+            if entry['resolution'] != resolution:
+                continue
+            distance = hamming_distance(entry['fingerprint'], fingerprint)
+            if distance <= self.max_hash_distance and (best_distance is None or distance < best_distance):
+                best_entry, best_distance = entry, distance
+        return best_entry, best_distance
+
+    # The cached circle fits while its edge is about as strong as at calibration time:
+    # a moved camera or arena leaves the circle on a flat background
+    def is_drifted(self, edges: np.ndarray, entry: dict) -> bool:
+        info_arena = entry['info_arena']
+        strength = measure_edge_strength(edges, info_arena['x_center'], info_arena['y_center'],
+                                         info_arena['radius_arena'])
+        self.edge_ratio = round(strength / entry['edge_strength'], 4) if entry['edge_strength'] > 0 else 0.0
+        return self.edge_ratio < self.min_edge_ratio
+
+    def lookup(self, frame: np.ndarray):
+        self.edge_ratio = None
+        entry, self.hash_distance = self.find_entry(self.load_entries(), compute_fingerprint(frame),
+                                                    [frame.shape[1], frame.shape[0]])
+        if entry is None:
+            self.status = 'miss'
+            return None
+        if self.is_drifted(compute_edge_image(frame), entry):
+            self.status = 'drift'
+            return None
+
+        self.status = 'hit'
+        info_arena = dict(entry['info_arena'])
+        for zone in ZONES:
+            info_arena[zone] = tuple(info_arena[zone])
+        return info_arena
+
+    # A drifted entry of the same rig is replaced by the new geometry. The store is locked from the read to
+    # the rename, so batch workers saving at the same time do not drop each other's entries
+    def save_arena(self, frame: np.ndarray, info_arena: dict):
+        fingerprint = compute_fingerprint(frame)
+        resolution = [frame.shape[1], frame.shape[0]]
+        edges = compute_edge_image(frame)
+        new_entry = {
+            'resolution': resolution,
+            'fingerprint': fingerprint,
+            'info_arena': info_arena,
+            'edge_strength': measure_edge_strength(edges, info_arena['x_center'], info_arena['y_center'],
+                                                   info_arena['radius_arena']),
+            'updated': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with lock_file(f'{self.path}.lock'):
+            entries = self.load_entries()
+            entry, _ = self.find_entry(entries, fingerprint, resolution)
+            if entry is not None:
+                entries.remove(entry)
+            entries.append(new_entry)
+            self.save_entries(entries)
+
+    def report(self) -> dict:
+        return {
+            'path': self.path,
+            'status': self.status,
+            'hash_distance': self.hash_distance,
+            'edge_ratio': self.edge_ratio
+        }
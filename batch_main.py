@@ -0,0 +1,253 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from arena_calibration import DEFAULT_CALIBRATION_PATH
+from main import PATH_TO_WEIGHT_YOLO, PATH_TO_BEHAVIOR_WEIGHT_YOLO
+from model_registry import BACKENDS, resolve_backend, resolve_weights
+from plotter import PLOT_PROFILES, DEFAULT_PLOT_PROFILE, VECTOR_FORMATS
+from video_encoder import DEFAULT_FOURCC
+from session_export import EXPORT_FORMATS, DEFAULT_EXPORT_FORMAT
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi')
+DEFAULT_MANIFEST = 'batch_manifest.json'
+MAX_ATTEMPTS = 2
+
+worker_models = {}
+
+
+def collect_videos(inputs: list) -> list:
+    videos = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            paths = [os.path.join(pattern, name) for name in sorted(os.listdir(pattern))]
+        else:
+            paths = sorted(glob.glob(pattern))
+        for path in paths:
+            if path.lower().endswith(VIDEO_EXTENSIONS) and path not in videos:
+                videos.append(path)
+    return videos
+
+
+def init_worker(path_to_weight_yolo, path_to_behavior_weight_yolo, count_workers, backend):
+    import torch
+    from model_registry import MODEL_REGISTRY
+
+    torch.set_num_threads(max(1, os.cpu_count() // count_workers))
+    worker_models['pose'] = MODEL_REGISTRY.get(path_to_weight_yolo, backend, 'pose')
+    worker_models['behavior'] = MODEL_REGISTRY.get(path_to_behavior_weight_yolo, backend, 'classify')
+
+
+def process_video(path_to_video, path_to_weight_yolo, path_to_behavior_weight_yolo, options: dict) -> dict:
+    from mouse_detector import MouseDetector
+
+    entry = {'video': path_to_video, 'status': 'ok', 'error': None, 'frames': 0, 'wall_time': 0.0, 'fps': 0.0,
+             'worker_pid': os.getpid()}
+    start = time.perf_counter()
+    try:
+        mouse_detector = MouseDetector(path_to_video, path_to_weight_yolo, path_to_behavior_weight_yolo,
+                                       model=worker_models['pose'], behavior_model=worker_models['behavior'],
+                                       **options)
+        mouse_detector.detect()
+        entry['frames'] = mouse_detector.frame_count
+    except Exception as error:
+        traceback.print_exc()
+        entry['status'] = 'failed'
+        entry['error'] = f'{type(error).__name__}: {error}'
+
+    entry['wall_time'] = round(time.perf_counter() - start, 3)
+    if entry['wall_time'] > 0:
+        entry['fps'] = round(entry['frames'] / entry['wall_time'], 2)
+    return entry
+
+
+# Outputs are named after the video file name, so two videos with the same name would overwrite each other
+def find_name_conflicts(videos: list) -> dict:
+    seen = {}
+    conflicts = {}
+    for path in videos:
+        name = os.path.basename(path).split('.')[0]
+        if name in seen:
+            conflicts[path] = seen[name]
+        else:
+            seen[name] = path
+    return conflicts
+
+
+# A retried video continues from its last checkpoint when checkpoints are enabled
+def get_attempt_options(options: dict, attempt: int) -> dict:
+    if attempt > 1 and options.get('checkpoint_interval'):
+        return dict(options, do_resume=True)
+    return options
+
+
+def get_crash_entry(path: str, error: Exception) -> dict:
+    return {'video': path, 'status': 'failed', 'error': f'Worker crashed: {error}', 'frames': 0, 'wall_time': 0.0,
+            'fps': 0.0, 'worker_pid': None}
+
+
+# Runs the videos in one pool and returns the ones left unfinished by a crashed worker (e.g. killed by OOM).
+# The crash breaks the whole pool, so they include the videos that were running next to it or still queued
+def run_pool(paths: list, pool_size: int, path_to_weight_yolo: str, path_to_behavior_weight_yolo: str,
+             count_workers: int, options: dict, backend: str, attempts: dict, entries: dict) -> list:
+    crashed = []
+    with ProcessPoolExecutor(max_workers=pool_size, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker,
+                             initargs=(path_to_weight_yolo, path_to_behavior_weight_yolo, count_workers,
+                                       backend)) as executor:
+        futures = {executor.submit(process_video, path, path_to_weight_yolo, path_to_behavior_weight_yolo,
+                                   get_attempt_options(options, attempts[path])): path
+                   for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                entries[path] = future.result()
+                print(f'[{entries[path]["status"]}] {path}: {entries[path]["frames"]} frames, '
+                      f'{entries[path]["wall_time"]:.1f} s, {entries[path]["fps"]:.1f} frames/s')
+            except BrokenProcessPool as error:
+                entries[path] = get_crash_entry(path, error)
+                crashed.append(path)
+    return crashed
+
+
+# In a single-worker pool a crash can only be caused by the video itself, so a video that keeps crashing fails
+# without charging an attempt to the others
+def retry_isolated(path: str, path_to_weight_yolo: str, path_to_behavior_weight_yolo: str, count_workers: int,
+                   options: dict, backend: str, attempts: dict, entries: dict):
+    while attempts[path] < MAX_ATTEMPTS:
+        attempts[path] += 1
+        if not run_pool([path], 1, path_to_weight_yolo, path_to_behavior_weight_yolo, count_workers, options,
+                        backend, attempts, entries):
+            break
+
+
+def run_batch(videos: list, path_to_weight_yolo: str, path_to_behavior_weight_yolo: str,
+              count_workers: int, options: dict, backend: str = 'torch') -> list:
+    entries = {}
+    for path, original in find_name_conflicts(videos).items():
+        entries[path] = {'video': path, 'status': 'skipped', 'error': f'Output names clash with {original}',
+                         'frames': 0, 'wall_time': 0.0, 'fps': 0.0, 'worker_pid': None}
+
+    pending = [path for path in videos if path not in entries]
+    attempts = {path: 1 for path in pending}
+    crashed = run_pool(pending, count_workers, path_to_weight_yolo, path_to_behavior_weight_yolo, count_workers,
+                       options, backend, attempts, entries)
+
+    # Which of the unfinished videos crashed the shared pool is unknown, so each of them is retried in a pool of its
+    # own. The isolated pools run side by side
+    with ThreadPoolExecutor(max_workers=count_workers) as executor:
+        futures = [executor.submit(retry_isolated, path, path_to_weight_yolo, path_to_behavior_weight_yolo,
+                                   count_workers, options, backend, attempts, entries)
+                   for path in crashed]
+        for future in futures:
+            future.result()
+
+    return [entries[path] for path in videos]
+
+
+def save_manifest(entries: list, path_to_manifest: str, wall_time: float):
+    total_frames = sum(entry['frames'] for entry in entries)
+    manifest = {
+        'videos': len(entries),
+        'succeeded': sum(entry['status'] == 'ok' for entry in entries),
+        'failed': sum(entry['status'] != 'ok' for entry in entries),
+        'wall_time': round(wall_time, 3),
+        'fps': round(total_frames / wall_time, 2) if wall_time > 0 else 0.0,
+        'entries': entries
+    }
+    with open(path_to_manifest, 'w') as file:
+        json.dump(manifest, file, indent=4, ensure_ascii=False)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Process a directory or glob of open field videos in parallel')
+    parser.add_argument('inputs', nargs='+', help='directories or glob patterns of videos')
+    parser.add_argument('--weights', default=PATH_TO_WEIGHT_YOLO)
+    parser.add_argument('--behavior-weights', default=PATH_TO_BEHAVIOR_WEIGHT_YOLO)
+    parser.add_argument('--workers', type=int, default=max(1, os.cpu_count() // 4))
+    parser.add_argument('--backend', choices=BACKENDS, default='torch')
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--behavior-stride', type=int, default=1)
+    parser.add_argument('--arena-roi', action='store_true', help='run the pose model on the arena crop only')
+    parser.add_argument('--roi-max-size', type=int, help='downscale the arena crop to this side, px')
+    parser.add_argument('--tracking', action='store_true', help='search the mouse near its previous position first')
+    parser.add_argument('--downscale-behavior-buffer', action='store_true',
+                        help='keep the behavior buffer at the classifier input size')
+    parser.add_argument('--fast-arena', action='store_true', help='coarse-to-fine search of the arena circle')
+    parser.add_argument('--arena-frames', type=int, default=1, help='median of the arena over the first frames')
+    parser.add_argument('--arena-calibration', nargs='?', const=DEFAULT_CALIBRATION_PATH,
+                        help='reuse the arena geometry of the same rig from this calibration store')
+    parser.add_argument('--checkpoint-interval', type=int, help='save a checkpoint every this many frames')
+    parser.add_argument('--resume', action='store_true', help='continue the videos from their checkpoints')
+    parser.add_argument('--fast-resume-seek', action='store_true',
+                        help='seek to the checkpoint instead of grabbing the frames, if the seek reads back exactly')
+    parser.add_argument('--raw-cache', action='store_true',
+                        help='keep the raw keypoints and probabilities for reanalyze.py')
+    parser.add_argument('--export-format', choices=EXPORT_FORMATS, default=DEFAULT_EXPORT_FORMAT,
+                        help='format of the combined session table')
+    parser.add_argument('--plot-profile', choices=tuple(PLOT_PROFILES), default=DEFAULT_PLOT_PROFILE,
+                        help='resolution of the plots: preview, standard or publication')
+    parser.add_argument('--plot-vector-formats', nargs='*', choices=VECTOR_FORMATS, default=[],
+                        help='also save the plots in these vector formats')
+    # The videos already run in parallel, so each video renders its plots in one process by default
+    parser.add_argument('--plot-workers', type=int, default=1, help='processes rendering the plots of a video')
+    parser.add_argument('--decimate-plots', action='store_true',
+                        help='draw long lines through LTTB points and the behavior scatter as a raster')
+    parser.add_argument('--output-video', action='store_true')
+    parser.add_argument('--video-size', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help='resolution of the debug video, the source one by default')
+    parser.add_argument('--video-frame-skip', type=int, default=1, help='write every this many frames to the debug video')
+    parser.add_argument('--video-fourcc', default=DEFAULT_FOURCC, help='codec of the debug video, e.g. H264, mp4v, MJPG')
+    parser.add_argument('--no-plots', action='store_true')
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST)
+    args = parser.parse_args()
+
+    videos = collect_videos(args.inputs)
+    if not videos:
+        raise SystemExit(f"[ERROR]: No videos found in {args.inputs}")
+
+    options = {
+        'do_output_video': args.output_video,
+        'do_plot_graphs': not args.no_plots,
+        'batch_size': args.batch_size,
+        'behavior_stride': args.behavior_stride,
+        'do_arena_roi': args.arena_roi,
+        'roi_max_size': args.roi_max_size,
+        'do_tracking': args.tracking,
+        'do_downscale_behavior_buffer': args.downscale_behavior_buffer,
+        'do_fast_arena_detection': args.fast_arena,
+        'arena_frames': args.arena_frames,
+        'arena_calibration_path': args.arena_calibration,
+        'checkpoint_interval': args.checkpoint_interval,
+        'do_resume': args.resume,
+        'do_fast_resume_seek': args.fast_resume_seek,
+        'do_raw_cache': args.raw_cache,
+        'export_format': args.export_format,
+        'plot_profile': args.plot_profile,
+        'plot_vector_formats': tuple(args.plot_vector_formats),
+        'plot_workers': args.plot_workers,
+        'do_decimate_plots': args.decimate_plots,
+        'video_output_size': tuple(args.video_size) if args.video_size else None,
+        'video_frame_skip': args.video_frame_skip,
+        'video_fourcc': args.video_fourcc
+    }
+
+    start = time.perf_counter()
+    # A missing runtime falls back to torch once here, so the run reports record the backend actually used
+    backend = resolve_backend(args.backend)
+    options['backend'] = backend
+    # Export once in the parent, so workers do not race to write the same exported files
+    resolve_weights(args.weights, backend)
+    resolve_weights(args.behavior_weights, backend)
+    entries = run_batch(videos, args.weights, args.behavior_weights, args.workers, options, backend)
+    manifest = save_manifest(entries, args.manifest, time.perf_counter() - start)
+    print(f'Processed {manifest["videos"]} videos: {manifest["succeeded"]} ok, {manifest["failed"]} failed. '
+          f'Manifest: {args.manifest}')
@@ -1,74 +1,124 @@
-import numpy as np
-import pandas
+import math
 import os
-import csv
-import cv2
 
-from ultralytics import YOLO
+from csv_writer import CSVWriterSession
+from composite_buffer import CompositeFrameBuffer, COUNT_FRAMES_IN_COMPOSITE_IMG
+from model_registry import load_model
+from profiler import Profiler
 
-COUNT_FRAMES_IN_COMPOSITE_IMG = 21
+DEFAULT_STRIDE = 1
+INTERPOLATION_MODES = ('linear', 'hold')
+DEFAULT_CLASSIFIER_IMGSZ = 640
+
+
+# Shortest edge size used by the classifier transforms of ultralytics (imgsz / crop_fraction)
+def get_classifier_input_size(model) -> int:
+    imgsz = model.overrides.get('imgsz', DEFAULT_CLASSIFIER_IMGSZ)
+    if isinstance(imgsz, (list, tuple)):
+        imgsz = imgsz[0]
+    return math.floor(imgsz / model.overrides.get('crop_fraction', 1.0))
 
 
 class BehaviorAnalyzer:
-    def __init__(self, height, width, path_to_behavior_weight_yolo, path_to_video):
-        self.buffer_img = []
+    def __init__(self, height, width, path_to_behavior_weight_yolo, path_to_video, csv_session=None,
+                 stride: int = DEFAULT_STRIDE, interpolation: str = 'linear', model=None,
+                 backend: str = 'torch', profiler=None, do_downscale_buffer: bool = False):
+        if stride < 1:
+            raise ValueError(f"[ERROR]: Stride must be positive, got {stride}")
+        if interpolation not in INTERPOLATION_MODES:
+            raise ValueError(f"[ERROR]: Unknown interpolation {interpolation}, expected one of {INTERPOLATION_MODES}")
+
         self.buffer_behaviors = []
         self.info_behavior_of_mouse = None
+        self.stride = stride
+        self.interpolation = interpolation
+        self.count_analyzed_frames = 0
+        self.count_pending_rows = 0
+        self.last_probs = None
+        self.profiler = profiler if profiler is not None else Profiler()
 
         self.height = height
         self.width = width
-        self.model = YOLO(path_to_behavior_weight_yolo)
+        self.model = model if model is not None else load_model(path_to_behavior_weight_yolo, backend, 'classify')
+        input_size = get_classifier_input_size(self.model) if do_downscale_buffer else None
+        self.buffer = CompositeFrameBuffer(height, width, input_size=input_size)
         self.shift = COUNT_FRAMES_IN_COMPOSITE_IMG // 2
 
         self.output_name_csv = self.get_name_output_csv(path_to_video)
-        self.init_csv_file()
+        self.csv_session = csv_session if csv_session is not None else CSVWriterSession()
+        self.csv_writer = self.init_csv_file()
 
     def init_csv_file(self):
         row = []
         for value in self.model.names.values():
             row.append(value)
-        with open(f'{self.output_name_csv}.csv', 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(row)
-
-
-    def create_composite_frame(self):
-        index_current_img = COUNT_FRAMES_IN_COMPOSITE_IMG // 2
-        current_frame = self.buffer_img[index_current_img]
-        prev_frames = self.buffer_img[:index_current_img]
-        next_frames = self.buffer_img[(index_current_img + 1):]
-
-        current_red = current_frame[:, :, 2]
-
-        avg_green = np.mean([frame[:, :, 1] for frame in prev_frames], axis=0)
-
-        avg_blue = np.mean([frame[:, :, 0] for frame in next_frames], axis=0)
-
-        composite_img = np.stack((avg_blue, avg_green, current_red), axis=2).astype(np.uint8)
-
-        return composite_img
+        return self.csv_session.open('behavior', f'{self.output_name_csv}.csv', row)
 
     def update_buffer(self, frame):
-
-        if self.buffer_is_full():
-            self.buffer_img.pop(0)
-            self.buffer_img.append(frame)
-        else:
-            self.buffer_img.append(frame)
+        with self.profiler.measure('behavior buffer'):
+            self.buffer.update(frame)
 
     def buffer_is_full(self):
-        return len(self.buffer_img) >= COUNT_FRAMES_IN_COMPOSITE_IMG
+        return self.buffer.is_full()
+
+    def create_composite_frame(self):
+        return self.buffer.create_composite_frame()
 
     def analyze(self):
-        composite_img = self.create_composite_frame()
-        results = self.model(composite_img)
+        is_key_frame = self.count_analyzed_frames % self.stride == 0
+        self.count_analyzed_frames += 1
+
+        if is_key_frame:
+            probs_behavior_mouse = self.classify()
+            self.export_pending_rows(probs_behavior_mouse)
+            self.export_to_csv(probs_behavior_mouse)
+            self.last_probs = probs_behavior_mouse
+        elif self.interpolation == 'hold':
+            self.export_to_csv(self.last_probs)
+        else:
+            self.count_pending_rows += 1
+
+    def classify(self):
+        with self.profiler.measure('behavior composite'):
+            composite_img = self.create_composite_frame()
+        with self.profiler.measure('behavior inference'):
+            results = self.model(composite_img)
         for result in results:
             probs = result.probs
             probs_behavior_mouse = []
             for key in self.model.names.keys():
                 probs_behavior_mouse.append(round(float(probs.data[key]), 3))
-
-        self.export_to_csv(probs_behavior_mouse)
+        return probs_behavior_mouse
+
+    # Rows between two key frames are written once the next key frame is classified
+    def export_pending_rows(self, probs_next_key_frame):
+        count_steps = self.count_pending_rows + 1
+        for step in range(1, count_steps):
+            weight = step / count_steps
+            row = [round(prob_prev + (prob_next - prob_prev) * weight, 3)
+                   for prob_prev, prob_next in zip(self.last_probs, probs_next_key_frame)]
+            self.export_to_csv(row)
+        self.count_pending_rows = 0
+
+    # Rows after the last key frame have no right neighbour, so they hold the last probabilities
+    def finish(self):
+        for _ in range(self.count_pending_rows):
+            self.export_to_csv(self.last_probs)
+        self.count_pending_rows = 0
+
+    def get_state(self) -> dict:
+        return {
+            'count_analyzed_frames': self.count_analyzed_frames,
+            'count_pending_rows': self.count_pending_rows,
+            'last_probs': self.last_probs,
+            'buffer': self.buffer.get_state()
+        }
+
+    def set_state(self, state: dict):
+        self.count_analyzed_frames = state['count_analyzed_frames']
+        self.count_pending_rows = state['count_pending_rows']
+        self.last_probs = state['last_probs']
+        self.buffer.set_state(state['buffer'])
 
     def get_name_output_csv(self, path_to_video):
         output_filename = os.path.basename(path_to_video)
@@ -76,9 +126,8 @@ class BehaviorAnalyzer:
         return name
 
     def export_to_csv(self, probs_behavior_mouse):
-        with open(f'{self.output_name_csv}.csv', 'a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(probs_behavior_mouse)
+        with self.profiler.measure('csv io'):
+            self.csv_writer.writerow(probs_behavior_mouse)
 
 
 
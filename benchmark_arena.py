@@ -0,0 +1,68 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from analytic_image_processor import AnalyticImageProcessor, median_info_arena
+from compare_backends import read_sample_frames, summarize_latency
+
+DEFAULT_REPEATS = 5
+DEFAULT_ARENA_FRAMES = 1
+
+
+def search_arena(frame: np.ndarray, multi_scale: bool) -> dict:
+    frame_analyzer = AnalyticImageProcessor(frame, multi_scale)
+    frame_analyzer.search_zones()
+    return frame_analyzer.get_info_arena()
+
+
+def run_arena_detection(frames: list, multi_scale: bool, repeats: int) -> tuple[dict, np.ndarray]:
+    latencies = []
+    info_arena = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        infos_arena = [search_arena(frame, multi_scale) for frame in frames]
+        info_arena = infos_arena[0] if len(infos_arena) == 1 else median_info_arena(infos_arena)
+        latencies.append(time.perf_counter() - start)
+    return info_arena, np.array(latencies) * 1000
+
+
+def compare_arenas(reference: dict, compared: dict) -> dict:
+    return {
+        'center_shift_px': round(float(np.hypot(reference['x_center'] - compared['x_center'],
+                                                reference['y_center'] - compared['y_center'])), 2),
+        'radius_diff_px': compared['radius_arena'] - reference['radius_arena'],
+        'central_radius_diff_px': compared['central_zone'][1] - reference['central_zone'][1]
+    }
+
+
+def benchmark_arena(path_to_video: str, count_frames: int, repeats: int) -> dict:
+    frames = read_sample_frames(path_to_video, count_frames)
+    if not frames:
+        raise ValueError(f"[ERROR]: No frames read from {path_to_video}")
+
+    report = {'video': path_to_video, 'frames': len(frames), 'repeats': repeats}
+    info_single, latencies_single = run_arena_detection(frames, False, repeats)
+    info_multi, latencies_multi = run_arena_detection(frames, True, repeats)
+    report['single_scale'] = {'latency': summarize_latency(latencies_single), 'arena': info_single}
+    report['multi_scale'] = {'latency': summarize_latency(latencies_multi), 'arena': info_multi}
+    report['difference'] = compare_arenas(info_single, info_multi)
+    report['speedup'] = round(float(latencies_single.mean() / latencies_multi.mean()), 2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare single-scale and coarse-to-fine arena detection')
+    parser.add_argument('video')
+    parser.add_argument('--frames', type=int, default=DEFAULT_ARENA_FRAMES,
+                        help='take the median of the arena over this many first frames')
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS)
+    parser.add_argument('--json', help='save the report to this file')
+    args = parser.parse_args()
+
+    report = benchmark_arena(args.video, args.frames, args.repeats)
+    print(json.dumps(report, indent=4))
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=4)
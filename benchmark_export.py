@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from plotter import BEHAVIORS, ZONES_ARENA
+from session_export import EXPORT_FORMATS, is_format_available, load_session_data, read_session_data, \
+    write_session_data
+
+DEFAULT_COUNT_ROWS = 100000
+DEFAULT_FPS = 30
+SHIFT_ROWS = 10
+
+
+# Table with the columns and types of the combined session data
+def generate_session_data(count_rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    times = np.arange(count_rows) / DEFAULT_FPS
+    zones = np.zeros((count_rows, len(ZONES_ARENA)), dtype=bool)
+    zones[np.arange(count_rows), rng.integers(0, len(ZONES_ARENA), count_rows)] = True
+    df = pd.DataFrame({
+        'Time, m:s': [f'{int(m):02d}:{s:05.2f}'.replace('.', ',') for m, s in zip(*np.divmod(times, 60))],
+        'Time, s': np.round(times, 2),
+        'X, px': rng.integers(-400, 400, count_rows),
+        'Y, px': rng.integers(-400, 400, count_rows)
+    })
+    for index, zone in enumerate(ZONES_ARENA):
+        df[zone] = zones[:, index]
+    df['Angle btw head&body, degrees'] = rng.integers(0, 360, count_rows)
+    df['Speed, m/s'] = np.round(rng.gamma(1.0, 0.05, count_rows), 3)
+
+    behaviors = rng.integers(0, len(BEHAVIORS), count_rows)
+    for index, behavior in enumerate(BEHAVIORS):
+        column = pd.Series(behaviors == index, dtype=object)
+        column.iloc[:SHIFT_ROWS] = np.nan
+        column.iloc[-SHIFT_ROWS:] = np.nan
+        df[behavior] = column
+    return df
+
+
+def benchmark_export(df: pd.DataFrame, formats: list) -> dict:
+    report = {'rows': len(df), 'formats': {}}
+    with tempfile.TemporaryDirectory() as directory:
+        for export_format in formats:
+            if not is_format_available(export_format):
+                report['formats'][export_format] = None
+                continue
+            path = os.path.join(directory, f'session_data.{export_format}')
+            start = time.perf_counter()
+            write_session_data(df, path, export_format)
+            write_time = time.perf_counter() - start
+            start = time.perf_counter()
+            read_session_data(path, export_format)
+            read_time = time.perf_counter() - start
+            report['formats'][export_format] = {
+                'write_s': round(write_time, 4),
+                'read_s': round(read_time, 4),
+                'size_mb': round(os.path.getsize(path) / 2 ** 20, 3)
+            }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare write and read times of the session data formats')
+    parser.add_argument('--name', help='benchmark on the session data of this video name instead of generated rows')
+    parser.add_argument('--rows', type=int, default=DEFAULT_COUNT_ROWS)
+    parser.add_argument('--formats', nargs='+', choices=EXPORT_FORMATS, default=list(EXPORT_FORMATS))
+    args = parser.parse_args()
+
+    df = load_session_data(args.name) if args.name else generate_session_data(args.rows)
+    print(json.dumps(benchmark_export(df, args.formats), indent=4))
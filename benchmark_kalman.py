@@ -0,0 +1,77 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from csv_combiner import CSVCombiner, OBSERVATION_MATRIX
+from kalman_filter import SteadyStateKalmanFilter
+
+DEFAULT_COUNT_ROWS = 200000
+DEFAULT_SEED = 0
+MEAN_BOUT_LENGTH = 50
+
+
+# Behavior bouts with noisy probabilities, like the rows of the _beh csv
+def generate_probs(count_rows: int, count_behaviors: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    count_bouts = count_rows // MEAN_BOUT_LENGTH + 1
+    lengths = rng.geometric(1 / MEAN_BOUT_LENGTH, count_bouts)
+    behaviors = np.repeat(rng.integers(0, count_behaviors, count_bouts), lengths)[:count_rows]
+    alpha = np.ones((count_rows, count_behaviors))
+    alpha[np.arange(len(behaviors)), behaviors] = 8
+    probs = rng.gamma(alpha)
+    return np.round(probs / probs.sum(axis=1, keepdims=True), 3)
+
+
+def run_pykalman(probs: np.ndarray, transition_covariance, observation_covariance):
+    from pykalman import KalmanFilter
+
+    kf = KalmanFilter(transition_matrices=np.eye(probs.shape[1]), observation_matrices=OBSERVATION_MATRIX,
+                      initial_state_mean=probs[0], transition_covariance=transition_covariance,
+                      observation_covariance=observation_covariance)
+    return kf.filter(probs)[0]
+
+
+def benchmark_kalman(probs: np.ndarray) -> dict:
+    count_behaviors = probs.shape[1]
+    Q = np.eye(count_behaviors) * 0.01
+    R = np.eye(count_behaviors) * 0.1
+    report = {'rows': len(probs)}
+
+    start = time.perf_counter()
+    kf = SteadyStateKalmanFilter(np.eye(count_behaviors), OBSERVATION_MATRIX, Q, R)
+    means = kf.filter(probs, probs[0])
+    report['steady_state_s'] = round(time.perf_counter() - start, 4)
+    report['transient_steps'] = len(kf.transient_gains)
+
+    start = time.perf_counter()
+    CSVCombiner(None, None, 0).calman(pd.DataFrame(probs))
+    report['calman_s'] = round(time.perf_counter() - start, 4)
+
+    try:
+        start = time.perf_counter()
+        means_reference = run_pykalman(probs, Q, R)
+    except ImportError:
+        report['pykalman_s'] = None
+        return report
+    report['pykalman_s'] = round(time.perf_counter() - start, 4)
+    report['speedup'] = round(report['pykalman_s'] / report['steady_state_s'], 1)
+    report['max_abs_diff'] = float(np.abs(means - means_reference).max())
+    report['argmax_agreement'] = float((means.argmax(axis=1) == means_reference.argmax(axis=1)).mean())
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the steady-state Kalman filter with pykalman')
+    parser.add_argument('--csv', help='_beh csv to filter instead of generated rows')
+    parser.add_argument('--rows', type=int, default=DEFAULT_COUNT_ROWS)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+
+    if args.csv:
+        probs = pd.read_csv(args.csv).to_numpy(dtype=np.float64)
+    else:
+        probs = generate_probs(args.rows, OBSERVATION_MATRIX.shape[1], args.seed)
+    print(json.dumps(benchmark_kalman(probs), indent=4))
@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from session_export import EXPORT_FORMATS, read_session_data, resolve_export_format, write_session_data, \
+    DEFAULT_EXPORT_FORMAT
+
+BOUTS_COLUMNS = ['Behavior', 'Start row', 'End row', 'Start, s', 'End, s', 'Duration, s']
+NO_BEHAVIOR = -1
+# The table has rows only for the frames with a found mouse: a step longer than this many median steps
+# is a gap in the detection, which ends the bout
+MAX_GAP_STEPS = 1.5
+
+
+# Run-length encoding of the smoothed ethogram: one row per bout of a behavior, the end row is exclusive.
+# A bout ends where the next one starts; before a detection gap and at the end of the table it lasts
+# one median step after its last row. Rows without a behavior (the shifted edges of the table) do not belong
+# to any bout
+def encode_bouts(behaviors: pd.DataFrame, times: np.ndarray) -> pd.DataFrame:
+    values = behaviors.to_numpy(dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    count_rows = len(values)
+    if count_rows == 0:
+        return pd.DataFrame(columns=BOUTS_COLUMNS)
+
+    has_behavior = np.nan_to_num(values).sum(axis=1) > 0
+    labels = np.where(has_behavior, np.nan_to_num(values).argmax(axis=1), NO_BEHAVIOR)
+    steps = np.diff(times)
+    step = np.median(steps) if count_rows > 1 else 0.0
+    is_gap = steps > MAX_GAP_STEPS * step
+    starts = np.concatenate([[0], np.flatnonzero((np.diff(labels) != 0) | is_gap) + 1])
+    ends = np.append(starts[1:], count_rows)
+
+    # End time of a bout whose last row is this row
+    times_end = np.append(np.where(is_gap, times[:-1] + step, times[1:]), times[-1] + step)
+    is_bout = labels[starts] != NO_BEHAVIOR
+    starts, ends = starts[is_bout], ends[is_bout]
+
+    bouts = pd.DataFrame({
+        'Behavior': behaviors.columns.to_numpy()[labels[starts]],
+        'Start row': starts,
+        'End row': ends,
+        'Start, s': times[starts],
+        'End, s': times_end[ends - 1]
+    })
+    bouts['Duration, s'] = (bouts['End, s'] - bouts['Start, s']).round(6)
+    return bouts
+
+
+def summarize_bouts(bouts: pd.DataFrame, behaviors: list) -> pd.DataFrame:
+    durations = bouts.groupby('Behavior')['Duration, s']
+    stats = pd.DataFrame({
+        'Bouts': durations.count(),
+        'Total, s': durations.sum(),
+        'Mean, s': durations.mean(),
+        'Median, s': durations.median(),
+        'Max, s': durations.max()
+    }).reindex(behaviors)
+    # A behavior without bouts has zero stats rather than NaN, which is not valid in the JSON report
+    stats = stats.fillna(0.0)
+    stats['Bouts'] = stats['Bouts'].astype(np.int64)
+    total = stats['Total, s'].sum()
+    stats['Share of time, %'] = stats['Total, s'] / total * 100 if total > 0 else 0.0
+    return stats.round(3)
+
+
+def get_path_bouts(name: str, export_format: str) -> str:
+    return os.path.join('mouse_data', f'{name}_bouts.{export_format}')
+
+
+# The newest saved bouts of the session, or None for sessions saved before the bouts were
+def load_bouts(name: str):
+    paths = [(get_path_bouts(name, export_format), export_format) for export_format in EXPORT_FORMATS]
+    paths = [(path, export_format) for path, export_format in paths if os.path.exists(path)]
+    if not paths:
+        return None
+    path, export_format = max(paths, key=lambda item: os.path.getmtime(item[0]))
+    return read_session_data(path, export_format)
+
+
+def save_bouts(bouts: pd.DataFrame, name: str, export_format: str = DEFAULT_EXPORT_FORMAT) -> str:
+    export_format = resolve_export_format(export_format)
+    os.makedirs('mouse_data', exist_ok=True)
+    path = get_path_bouts(name, export_format)
+    write_session_data(bouts, path, export_format)
+    return path
@@ -0,0 +1,59 @@
+import json
+import os
+
+import numpy as np
+
+ARRAY_MARKER = '__array__'
+META_KEY = '__meta__'
+
+
+# Arrays of the nested state go to separate npz entries, the rest is kept as JSON in the same file
+def split_state(state, arrays: dict, prefix: str = ''):
+    if isinstance(state, np.ndarray):
+        arrays[prefix] = state
+        return {ARRAY_MARKER: prefix}
+    if isinstance(state, dict):
+        return {key: split_state(value, arrays, f'{prefix}.{key}' if prefix else key) for key, value in state.items()}
+    return state
+
+
+def merge_state(meta, arrays):
+    if isinstance(meta, dict):
+        if ARRAY_MARKER in meta:
+            return arrays[meta[ARRAY_MARKER]]
+        return {key: merge_state(value, arrays) for key, value in meta.items()}
+    return meta
+
+
+class CheckpointStore:
+    def __init__(self, path: str):
+        self.path = path
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    # Written to a temporary file and renamed, so a crash while saving keeps the previous checkpoint
+    def save(self, state: dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        arrays = {}
+        meta = split_state(state, arrays)
+        path_tmp = f'{self.path}.tmp'
+        with open(path_tmp, 'wb') as file:
+            np.savez(file, **arrays, **{META_KEY: np.array(json.dumps(meta))})
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path_tmp, self.path)
+
+    def load(self):
+        if not self.exists():
+            return None
+        with np.load(self.path) as data:
+            arrays = {key: data[key] for key in data.files if key != META_KEY}
+            meta = json.loads(str(data[META_KEY]))
+        return merge_state(meta, arrays)
+
+    def remove(self):
+        if self.exists():
+            os.remove(self.path)
@@ -0,0 +1,144 @@
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from composite_buffer import CompositeFrameBuffer
+from main import PATH_TO_WEIGHT_YOLO, PATH_TO_BEHAVIOR_WEIGHT_YOLO
+from model_registry import BACKENDS, is_backend_available, load_model
+
+DEFAULT_COUNT_FRAMES = 300
+
+
+def read_sample_frames(path_to_video: str, count_frames: int) -> list:
+    video = cv2.VideoCapture(path_to_video)
+    if not video.isOpened():
+        raise ValueError(f"[ERROR]: Couldn't open the video {path_to_video}")
+    frames = []
+    while len(frames) < count_frames:
+        ret, frame = video.read()
+        if not ret:
+            break
+        frames.append(frame)
+    video.release()
+    return frames
+
+
+def build_composites(frames: list, input_size: int = None) -> list:
+    height, width, _ = frames[0].shape
+    buffer = CompositeFrameBuffer(height, width, input_size=input_size)
+    composites = []
+    for frame in frames:
+        buffer.update(frame)
+        if buffer.is_full():
+            composites.append(buffer.create_composite_frame())
+    return composites
+
+
+def run_timed(model, images: list, extract) -> tuple[list, np.ndarray]:
+    outputs = []
+    latencies = []
+    for image in images:
+        start = time.perf_counter()
+        results = model(image, verbose=False)
+        latencies.append(time.perf_counter() - start)
+        outputs.append(extract(results[0]))
+    return outputs, np.array(latencies) * 1000
+
+
+def extract_keypoints(result):
+    xy = result.keypoints.xy.cpu().numpy()
+    return xy[0] if len(xy) and len(xy[0]) else None
+
+
+def extract_probs(result):
+    return result.probs.data.cpu().numpy()
+
+
+def summarize_latency(latencies: np.ndarray) -> dict:
+    return {
+        'mean_ms': round(float(latencies.mean()), 2),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 2)
+    }
+
+
+def compare_keypoints(reference: list, compared: list) -> dict:
+    distances = []
+    mismatched_detections = 0
+    for keypoints_reference, keypoints_compared in zip(reference, compared):
+        if (keypoints_reference is None) != (keypoints_compared is None):
+            mismatched_detections += 1
+        elif keypoints_reference is not None:
+            distances.append(np.linalg.norm(keypoints_reference - keypoints_compared, axis=1))
+    distances = np.concatenate(distances) if distances else np.zeros(1)
+    return {
+        'mismatched_detections': mismatched_detections,
+        'mean_drift_px': round(float(distances.mean()), 3),
+        'max_drift_px': round(float(distances.max()), 3)
+    }
+
+
+def compare_probs(reference: list, compared: list) -> dict:
+    reference = np.array(reference)
+    compared = np.array(compared)
+    difference = np.abs(reference - compared)
+    return {
+        'mean_abs_diff': round(float(difference.mean()), 5),
+        'max_abs_diff': round(float(difference.max()), 5),
+        'argmax_agreement': round(float((reference.argmax(axis=1) == compared.argmax(axis=1)).mean()), 4)
+    }
+
+
+def compare_backends(path_to_video, path_to_weight_yolo, path_to_behavior_weight_yolo, backends, count_frames):
+    frames = read_sample_frames(path_to_video, count_frames)
+    if not frames:
+        raise ValueError(f"[ERROR]: No frames read from {path_to_video}")
+    composites = build_composites(frames)
+
+    outputs = {}
+    report = {'video': path_to_video, 'frames': len(frames), 'composites': len(composites), 'backends': {}}
+    for backend in ['torch'] + [backend for backend in backends if backend != 'torch']:
+        # load_model would fall back to torch and the report would compare torch with itself
+        if not is_backend_available(backend):
+            print(f'[WARNING]: Backend {backend} is not installed, skipping it')
+            report['backends'][backend] = {'skipped': 'not installed'}
+            continue
+        pose_model = load_model(path_to_weight_yolo, backend, 'pose')
+        behavior_model = load_model(path_to_behavior_weight_yolo, backend, 'classify')
+        # The first call builds the predictor, so it is left out of the latency
+        pose_model(frames[0], verbose=False)
+        behavior_model(composites[0] if composites else frames[0], verbose=False)
+
+        keypoints, pose_latencies = run_timed(pose_model, frames, extract_keypoints)
+        probs, behavior_latencies = run_timed(behavior_model, composites, extract_probs)
+        outputs[backend] = (keypoints, probs)
+
+        entry = {'pose_latency': summarize_latency(pose_latencies)}
+        if composites:
+            entry['behavior_latency'] = summarize_latency(behavior_latencies)
+        if backend != 'torch':
+            entry['keypoints'] = compare_keypoints(outputs['torch'][0], keypoints)
+            if composites:
+                entry['probs'] = compare_probs(outputs['torch'][1], probs)
+        report['backends'][backend] = entry
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare CPU inference backends against the PyTorch reference')
+    parser.add_argument('video')
+    parser.add_argument('--weights', default=PATH_TO_WEIGHT_YOLO)
+    parser.add_argument('--behavior-weights', default=PATH_TO_BEHAVIOR_WEIGHT_YOLO)
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=['onnx', 'openvino'])
+    parser.add_argument('--frames', type=int, default=DEFAULT_COUNT_FRAMES)
+    parser.add_argument('--json', help='save the report to this file')
+    args = parser.parse_args()
+
+    report = compare_backends(args.video, args.weights, args.behavior_weights, args.backends, args.frames)
+    print(json.dumps(report, indent=4))
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=4)
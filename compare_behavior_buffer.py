@@ -0,0 +1,58 @@
+import argparse
+import json
+import sys
+
+from behavior_analyzer import get_classifier_input_size
+from compare_backends import read_sample_frames, build_composites, run_timed, extract_probs, compare_probs, \
+    summarize_latency, DEFAULT_COUNT_FRAMES
+from main import PATH_TO_BEHAVIOR_WEIGHT_YOLO
+from model_registry import BACKENDS, load_model
+
+DEFAULT_TOLERANCE = 0.05
+
+
+def compare_behavior_buffer(path_to_video, path_to_behavior_weight_yolo, backend, count_frames, tolerance):
+    frames = read_sample_frames(path_to_video, count_frames)
+    model = load_model(path_to_behavior_weight_yolo, backend, 'classify')
+    input_size = get_classifier_input_size(model)
+
+    composites_full = build_composites(frames)
+    composites_downscaled = build_composites(frames, input_size)
+    if not composites_full:
+        raise ValueError(f"[ERROR]: {path_to_video} has fewer frames than one composite needs")
+
+    model(composites_full[0], verbose=False)
+    probs_full, latencies_full = run_timed(model, composites_full, extract_probs)
+    probs_downscaled, latencies_downscaled = run_timed(model, composites_downscaled, extract_probs)
+
+    report = {
+        'video': path_to_video,
+        'composites': len(composites_full),
+        'input_size': input_size,
+        'buffer_shape_full': list(composites_full[0].shape),
+        'buffer_shape_downscaled': list(composites_downscaled[0].shape),
+        'latency_full': summarize_latency(latencies_full),
+        'latency_downscaled': summarize_latency(latencies_downscaled),
+        'probs': compare_probs(probs_full, probs_downscaled),
+        'tolerance': tolerance
+    }
+    report['within_tolerance'] = report['probs']['max_abs_diff'] <= tolerance
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check that a downscaled behavior buffer keeps the probabilities')
+    parser.add_argument('video')
+    parser.add_argument('--behavior-weights', default=PATH_TO_BEHAVIOR_WEIGHT_YOLO)
+    parser.add_argument('--backend', choices=BACKENDS, default='torch')
+    parser.add_argument('--frames', type=int, default=DEFAULT_COUNT_FRAMES)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--json', help='save the report to this file')
+    args = parser.parse_args()
+
+    report = compare_behavior_buffer(args.video, args.behavior_weights, args.backend, args.frames, args.tolerance)
+    print(json.dumps(report, indent=4))
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=4)
+    sys.exit(0 if report['within_tolerance'] else 1)
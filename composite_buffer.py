@@ -0,0 +1,110 @@
+import cv2
+import numpy as np
+
+COUNT_FRAMES_IN_COMPOSITE_IMG = 21
+
+
+class CompositeFrameBuffer:
+    def __init__(self, height, width, count_frames: int = COUNT_FRAMES_IN_COMPOSITE_IMG, input_size: int = None):
+        self.count_frames = count_frames
+        self.frame_size = (width, height)
+        self.height, self.width = self.get_buffer_shape(height, width, input_size)
+
+        self.count_prev_frames = self.count_frames // 2
+        self.count_next_frames = self.count_frames - self.count_prev_frames - 1
+        shape = (self.count_frames, self.height, self.width)
+        self.buffer_blue = np.zeros(shape, dtype=np.uint8)
+        self.buffer_green = np.zeros(shape, dtype=np.uint8)
+        self.buffer_red = np.zeros(shape, dtype=np.uint8)
+
+        dtype_sum = np.uint16 if self.count_frames * 255 <= np.iinfo(np.uint16).max else np.uint32
+        self.sum_green = np.zeros(shape[1:], dtype=dtype_sum)
+        self.sum_blue = np.zeros(shape[1:], dtype=dtype_sum)
+
+        self.count_frames_in_buffer = 0
+        self.index_oldest_frame = 0
+
+    # Like the shortest edge Resize of the classifier transforms, so the classifier does not resize the composite again
+    def get_buffer_shape(self, height, width, input_size):
+        if input_size is None or min(height, width) <= input_size:
+            return height, width
+        if height <= width:
+            return input_size, int(input_size * width / height)
+        return int(input_size * height / width), input_size
+
+    def prepare_frame(self, frame):
+        if (self.width, self.height) == self.frame_size:
+            return frame
+        return cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+
+    def get_index_in_buffer(self, position):
+        return (self.index_oldest_frame + position) % self.count_frames
+
+    def create_composite_frame(self):
+        index_current = self.get_index_in_buffer(self.count_prev_frames)
+
+        composite_img = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        composite_img[:, :, 0] = self.sum_blue // self.count_next_frames
+        composite_img[:, :, 1] = self.sum_green // self.count_prev_frames
+        composite_img[:, :, 2] = self.buffer_red[index_current]
+
+        return composite_img
+
+    # The green sum covers the frames before the current one and the blue sum covers the frames after it,
+    # so each shift of the window moves one frame in and one frame out of every sum.
+    def update(self, frame):
+        frame = self.prepare_frame(frame)
+        if self.is_full():
+            index_outgoing = self.get_index_in_buffer(0)
+            index_current = self.get_index_in_buffer(self.count_prev_frames)
+            index_next = self.get_index_in_buffer(self.count_prev_frames + 1)
+
+            self.sum_green -= self.buffer_green[index_outgoing]
+            self.sum_green += self.buffer_green[index_current]
+            self.sum_blue -= self.buffer_blue[index_next]
+
+            self.write_frame_to_buffer(index_outgoing, frame)
+            self.sum_blue += self.buffer_blue[index_outgoing]
+            self.index_oldest_frame = (self.index_oldest_frame + 1) % self.count_frames
+        else:
+            self.write_frame_to_buffer(self.count_frames_in_buffer, frame)
+            self.count_frames_in_buffer += 1
+            if self.is_full():
+                self.init_sums()
+
+    def write_frame_to_buffer(self, index, frame):
+        self.buffer_blue[index] = frame[:, :, 0]
+        self.buffer_green[index] = frame[:, :, 1]
+        self.buffer_red[index] = frame[:, :, 2]
+
+    def init_sums(self):
+        self.sum_green[:] = 0
+        self.sum_blue[:] = 0
+        for position in range(self.count_prev_frames):
+            self.sum_green += self.buffer_green[self.get_index_in_buffer(position)]
+        for position in range(self.count_prev_frames + 1, self.count_frames):
+            self.sum_blue += self.buffer_blue[self.get_index_in_buffer(position)]
+
+    # The sums are not saved, they are rebuilt from the planes
+    def get_state(self) -> dict:
+        return {
+            'blue': self.buffer_blue.copy(),
+            'green': self.buffer_green.copy(),
+            'red': self.buffer_red.copy(),
+            'count_frames_in_buffer': self.count_frames_in_buffer,
+            'index_oldest_frame': self.index_oldest_frame
+        }
+
+    def set_state(self, state: dict):
+        if state['blue'].shape != self.buffer_blue.shape:
+            raise ValueError(f"[ERROR]: Saved buffer {state['blue'].shape} does not match {self.buffer_blue.shape}")
+        self.buffer_blue[:] = state['blue']
+        self.buffer_green[:] = state['green']
+        self.buffer_red[:] = state['red']
+        self.count_frames_in_buffer = state['count_frames_in_buffer']
+        self.index_oldest_frame = state['index_oldest_frame']
+        if self.is_full():
+            self.init_sums()
+
+    def is_full(self):
+        return self.count_frames_in_buffer >= self.count_frames
@@ -0,0 +1,68 @@
+import math
+
+import cv2
+import numpy as np
+
+DEFAULT_ROI_MARGIN = 0.1
+# Largest stride of the YOLOv8 models: the sides of their input are multiples of it
+MODEL_STRIDE = 32
+
+
+# Input size [height, width] of the model for an image scaled by this factor, rounded up to the model stride
+def get_inference_size(height: int, width: int, scale: float) -> list:
+    return [max(MODEL_STRIDE, math.ceil(height * scale / MODEL_STRIDE) * MODEL_STRIDE),
+            max(MODEL_STRIDE, math.ceil(width * scale / MODEL_STRIDE) * MODEL_STRIDE)]
+
+
+class CropWindow:
+    def __init__(self, x_min: int, y_min: int, x_max: int, y_max: int, frame_shape: tuple, max_size: int = None):
+        height, width = frame_shape[:2]
+        self.x_min = max(0, int(x_min))
+        self.y_min = max(0, int(y_min))
+        self.x_max = min(width, int(x_max))
+        self.y_max = min(height, int(y_max))
+        if self.x_max <= self.x_min or self.y_max <= self.y_min:
+            raise ValueError(f"[ERROR]: Empty crop window ({x_min}, {y_min}, {x_max}, {y_max}) for frame {width}x{height}")
+
+        self.frame_height = height
+        self.frame_width = width
+        self.frame_pixels = height * width
+        side = max(self.x_max - self.x_min, self.y_max - self.y_min)
+        self.scale = max_size / side if max_size is not None and side > max_size else 1.0
+        self.max_scale = max_size / side if max_size is not None else math.inf
+
+    @classmethod
+    def from_arena(cls, info_arena: dict, frame_shape: tuple, margin: float = DEFAULT_ROI_MARGIN, max_size: int = None):
+        half_side = info_arena['radius_arena'] * (1 + margin)
+        return cls(info_arena['x_center'] - half_side, info_arena['y_center'] - half_side,
+                   info_arena['x_center'] + half_side, info_arena['y_center'] + half_side, frame_shape, max_size)
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        image = np.ascontiguousarray(frame[self.y_min:self.y_max, self.x_min:self.x_max])
+        if self.scale != 1.0:
+            size = (round(image.shape[1] * self.scale), round(image.shape[0] * self.scale))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return image
+
+    def to_frame_coordinates(self, xy: np.ndarray) -> np.ndarray:
+        return xy / self.scale + np.array([self.x_min, self.y_min], dtype=np.float32)
+
+    # The predictor letterbox scales every image to imgsz on its longest side, which would blow a crop back up
+    # to the model size. So the crop is run at the scale the full frame gets in the model, and the pixels cut
+    # off by the crop are not computed; max_size still caps the side of the crop
+    def get_imgsz(self, imgsz: int) -> list:
+        scale = min(imgsz / max(self.frame_height, self.frame_width), self.max_scale)
+        return get_inference_size(self.y_max - self.y_min, self.x_max - self.x_min, scale)
+
+    def get_input_pixels(self) -> int:
+        return round((self.x_max - self.x_min) * self.scale) * round((self.y_max - self.y_min) * self.scale)
+
+    def get_pixel_reduction(self) -> float:
+        return 1 - self.get_input_pixels() / self.frame_pixels
+
+    def to_dict(self) -> dict:
+        return {
+            'box': [self.x_min, self.y_min, self.x_max, self.y_max],
+            'scale': round(self.scale, 4),
+            'pixel_reduction': round(self.get_pixel_reduction(), 4)
+        }
@@ -1,10 +1,14 @@
 import pandas as pd
 import numpy as np
-import os
-from pykalman import KalmanFilter
+
+from bouts import encode_bouts, save_bouts
+from kalman_filter import SteadyStateKalmanFilter
+from session_export import get_export_format, save_session_data, DEFAULT_EXPORT_FORMAT
 
 
 BLOCK_SIZE = 25
+TIME_COLUMN = 'Time, m:s'
+TIME_SECONDS_COLUMN = 'Time, s'
 OBSERVATION_MATRIX = np.array([
     [1.0, 0.0, 0.0],
     [0.0, 1.0, 0.0],
@@ -12,27 +16,44 @@ OBSERVATION_MATRIX = np.array([
 ])
 
 
+# Seconds from the "mm:ss,cc" strings of the _static csv
+def parse_times(times: pd.Series) -> pd.Series:
+    parts = times.str.extract(r'^(\d+):(\d+),(\d+)$').astype(np.int64)
+    return parts[0] * 60 + parts[1] + parts[2] / 100
+
+
 class CSVCombiner:
-    def __init__(self, path_to_static_data, path_to_behavior_data, shift):
+    def __init__(self, path_to_static_data, path_to_behavior_data, shift, export_format=DEFAULT_EXPORT_FORMAT,
+                 block_size=BLOCK_SIZE):
+        if block_size < 1:
+            raise ValueError(f"[ERROR]: Block size must be positive, got {block_size}")
         self.path_to_static_data = path_to_static_data
         self.path_to_behavior_data = path_to_behavior_data
         self.shift = shift
+        self.export_format = export_format
+        self.block_size = block_size
 
     def combine(self):
         df_static = pd.read_csv(f'{self.path_to_static_data}.csv')
         df_beh = pd.read_csv(f'{self.path_to_behavior_data}.csv')
-        df_beh = self.calman(df_beh)
-        df_beh = self.smooth(df_beh)
+        df_beh = self.build_ethogram(df_beh)
 
         df_beh_shifted = pd.DataFrame(np.nan, index=range(self.shift), columns=df_beh.columns)
         df_beh_shifted = pd.concat([df_beh_shifted, df_beh], ignore_index=False)
         df_beh_shifted.index = range(len(df_beh_shifted))
 
         result = pd.concat([df_static, df_beh_shifted], axis=1)
+        result.insert(result.columns.get_loc(TIME_COLUMN) + 1, TIME_SECONDS_COLUMN, parse_times(result[TIME_COLUMN]))
+
+        name = self.path_to_behavior_data[:len(self.path_to_behavior_data) - 4]
+        self.path_to_session_data = save_session_data(result, name, self.export_format)
+        self.bouts = encode_bouts(result[df_beh.columns], result[TIME_SECONDS_COLUMN])
+        self.path_to_bouts = save_bouts(self.bouts, name, get_export_format(self.path_to_session_data))
+        return result
 
-        os.makedirs('mouse_data', exist_ok=True)
-        excel_file = f'mouse_data\\{self.path_to_behavior_data[:len(self.path_to_behavior_data) - 4]}_data.xlsx'
-        result.to_excel(excel_file, index=False)
+    def build_ethogram(self, df_beh):
+        df_beh = self.calman(df_beh)
+        return self.smooth(df_beh)
 
     def calman(self, df_beh):
         num_features = df_beh.shape[1]
@@ -42,32 +63,34 @@ class CSVCombiner:
         Q = np.eye(num_features) * 0.01
         R = np.eye(num_features) * 0.1
 
-        kf = KalmanFilter(transition_matrices=transition_matrix,
-                          observation_matrices=OBSERVATION_MATRIX,
-                          initial_state_mean=initial_state,
-                          transition_covariance=Q,
-                          observation_covariance=R)
-        filtered_state_means, _ = kf.filter(df_beh.values)
+        kf = SteadyStateKalmanFilter(transition_matrix, OBSERVATION_MATRIX, Q, R)
+        filtered_state_means = kf.filter(df_beh.values, initial_state)
         filtered_df = pd.DataFrame(filtered_state_means, columns=df_beh.columns)
         filtered_df = np.clip(filtered_df, 0, 1)
         filtered_df = filtered_df.div(filtered_df.sum(axis=1), axis=0)
         return filtered_df
 
+    # Every block of rows gets the behavior that wins in most of its rows; a tie in the count goes to the
+    # behavior with the higher mean probability in the block, and an exact tie of the means to the first column
     def smooth(self, df_beh):
-        df_beh_boolean = pd.concat([self.smooth_for_block(df_beh.iloc[i : i + BLOCK_SIZE]) for i in range(0, len(df_beh), BLOCK_SIZE)], axis=0)
-        return df_beh_boolean
-
-    def smooth_for_block(self, block):
-        max_indices = block.idxmax(axis=1)
-        max_count = max_indices.value_counts()
-
-        if len(max_count[max_count == max_count.max()]) > 1:
-            behs = max_count[max_count == max_count.max()].index
-            avg_probs = block[behs].mean()
-            selected_beh = avg_probs.idxmax()
-        else:
-            selected_beh = max_count.idxmax()
-
-        block_boolean = pd.DataFrame(False, index=block.index, columns=block.columns)
-        block_boolean[selected_beh] = True
-        return block_boolean
\ No newline at end of file
+        probs = df_beh.to_numpy(dtype=np.float64)
+        count_rows, count_behaviors = probs.shape
+        if count_rows == 0:
+            return pd.DataFrame(False, index=df_beh.index, columns=df_beh.columns)
+
+        block_indices = np.arange(count_rows) // self.block_size
+        count_blocks = block_indices[-1] + 1
+        winners = probs.argmax(axis=1)
+        counts = np.bincount(block_indices * count_behaviors + winners,
+                             minlength=count_blocks * count_behaviors).reshape(count_blocks, count_behaviors)
+
+        block_starts = np.arange(0, count_rows, self.block_size)
+        block_lengths = np.diff(np.append(block_starts, count_rows))
+        means = np.add.reduceat(probs, block_starts, axis=0) / block_lengths[:, None]
+
+        is_most_frequent = counts == counts.max(axis=1, keepdims=True)
+        selected = np.where(is_most_frequent, means, -np.inf).argmax(axis=1)
+
+        df_beh_boolean = np.zeros(probs.shape, dtype=bool)
+        df_beh_boolean[np.arange(count_rows), selected[block_indices]] = True
+        return pd.DataFrame(df_beh_boolean, index=df_beh.index, columns=df_beh.columns)
\ No newline at end of file
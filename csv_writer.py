@@ -0,0 +1,90 @@
+import csv
+import time
+
+DEFAULT_FLUSH_ROWS = 500
+DEFAULT_FLUSH_SECONDS = 5.0
+
+
+class BufferedCSVWriter:
+    def __init__(self, path: str, header: list, flush_rows: int = DEFAULT_FLUSH_ROWS,
+                 flush_seconds: float = DEFAULT_FLUSH_SECONDS, offset: int = None):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.rows = []
+
+        if offset is None:
+            self.file = open(path, 'w', newline='')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(header)
+        else:
+            # Resumed file: the header is already there and the rows written after the offset are dropped
+            self.file = open(path, 'r+', newline='')
+            self.file.seek(offset)
+            self.file.truncate()
+            self.writer = csv.writer(self.file)
+        self.time_last_flush = time.monotonic()
+
+    def writerow(self, row: list):
+        self.rows.append(row)
+        if len(self.rows) >= self.flush_rows or time.monotonic() - self.time_last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        if self.file.closed:
+            return
+        self.writer.writerows(self.rows)
+        self.rows.clear()
+        self.file.flush()
+        self.time_last_flush = time.monotonic()
+
+    def tell(self) -> int:
+        self.flush()
+        return self.file.tell()
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.file.close()
+
+
+class CSVWriterSession:
+    def __init__(self, flush_rows: int = DEFAULT_FLUSH_ROWS, flush_seconds: float = DEFAULT_FLUSH_SECONDS,
+                 resume_offsets: dict = None):
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.resume_offsets = resume_offsets if resume_offsets is not None else {}
+        self.writers = {}
+
+    def open(self, name: str, path: str, header: list) -> BufferedCSVWriter:
+        if name in self.writers:
+            self.writers[name].close()
+        writer = BufferedCSVWriter(path, header, self.flush_rows, self.flush_seconds, self.resume_offsets.get(name))
+        self.writers[name] = writer
+        return writer
+
+    def flush(self):
+        for writer in self.writers.values():
+            writer.flush()
+
+    def get_offsets(self) -> dict:
+        return {name: writer.tell() for name, writer in self.writers.items()}
+
+    def close(self):
+        errors = []
+        for writer in self.writers.values():
+            try:
+                writer.close()
+            except OSError as error:
+                errors.append(error)
+        if errors:
+            raise errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
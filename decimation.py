@@ -0,0 +1,47 @@
+import numpy as np
+
+MAX_LINE_POINTS = 5000
+SCATTER_RASTER_BINS = 120
+
+
+# Largest-Triangle-Three-Buckets: keeps the first and the last point and, from every bucket between them, the point
+# that forms the largest triangle with the point kept before it and the mean of the next bucket.
+# Works on any 2D points, (time, value) for a series or (x, y) for a trajectory; returns the kept indices
+def lttb(points: np.ndarray, threshold: int = MAX_LINE_POINTS) -> np.ndarray:
+    points = np.asarray(points, dtype=np.float64)
+    count_points = len(points)
+    if threshold < 3:
+        raise ValueError(f"[ERROR]: LTTB needs at least 3 points, got {threshold}")
+    if count_points <= threshold:
+        return np.arange(count_points)
+
+    edges = np.linspace(1, count_points - 1, threshold - 1).astype(np.int64)
+    means = np.add.reduceat(points[:-1], edges[:-1], axis=0) / np.diff(edges)[:, None]
+    means = np.vstack([means, points[-1:]])
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, count_points - 1
+    previous = points[0]
+    for bucket, (start, end) in enumerate(zip(edges[:-1], edges[1:])):
+        candidates = points[start:end]
+        next_mean = means[bucket + 1]
+        areas = np.abs((previous[0] - next_mean[0]) * (candidates[:, 1] - previous[1]) -
+                       (previous[0] - candidates[:, 0]) * (next_mean[1] - previous[1]))
+        index = start + int(areas.argmax())
+        indices[bucket + 1] = index
+        previous = points[index]
+    return indices
+
+
+# Image of the labelled points on a grid over the extent: every cell with points gets the color of its most
+# frequent label, empty cells stay transparent
+def rasterize_labels(x: np.ndarray, y: np.ndarray, labels: np.ndarray, colors: np.ndarray, extent: tuple,
+                     bins: int = SCATTER_RASTER_BINS) -> np.ndarray:
+    x_min, x_max, y_min, y_max = extent
+    counts = np.stack([np.histogram2d(y[labels == label], x[labels == label], bins=bins,
+                                      range=[[y_min, y_max], [x_min, x_max]])[0]
+                       for label in range(len(colors))])
+    image = np.zeros((bins, bins, 4))
+    image[...] = colors[counts.argmax(axis=0)]
+    image[..., 3] = counts.sum(axis=0) > 0
+    return image
@@ -0,0 +1,69 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from csv_combiner import CSVCombiner
+
+
+class EthogramComparator:
+    def __init__(self, path_to_reference_beh, path_to_compared_beh):
+        self.path_to_reference_beh = path_to_reference_beh
+        self.path_to_compared_beh = path_to_compared_beh
+
+    def compare(self) -> dict:
+        df_reference = pd.read_csv(self.path_to_reference_beh)
+        df_compared = pd.read_csv(self.path_to_compared_beh)
+        if list(df_reference.columns) != list(df_compared.columns):
+            raise ValueError(f"[ERROR]: Behavior columns differ: {list(df_reference.columns)} "
+                             f"vs {list(df_compared.columns)}")
+        if len(df_reference) != len(df_compared):
+            raise ValueError(f"[ERROR]: Row counts differ: {len(df_reference)} vs {len(df_compared)}")
+
+        combiner = CSVCombiner(self.path_to_reference_beh, self.path_to_compared_beh, 0)
+        ethogram_reference = combiner.build_ethogram(df_reference)
+        ethogram_compared = combiner.build_ethogram(df_compared)
+
+        labels_reference = ethogram_reference.idxmax(axis=1).to_numpy()
+        labels_compared = ethogram_compared.idxmax(axis=1).to_numpy()
+        mismatch = labels_reference != labels_compared
+
+        report = {
+            'rows': len(df_reference),
+            'agreement': round(float(1 - mismatch.mean()), 4) if len(mismatch) else 1.0,
+            'mismatched_rows': int(mismatch.sum()),
+            'mean_abs_prob_diff': round(float(np.abs(df_reference.values - df_compared.values).mean()), 4),
+            'behaviors': {}
+        }
+        for behavior in df_reference.columns:
+            in_reference = labels_reference == behavior
+            in_compared = labels_compared == behavior
+            report['behaviors'][behavior] = {
+                'rows_reference': int(in_reference.sum()),
+                'rows_compared': int(in_compared.sum()),
+                'rows_both': int((in_reference & in_compared).sum())
+            }
+        return report
+
+
+def print_report(report: dict):
+    print(f'Rows: {report["rows"]}, agreement: {report["agreement"] * 100:.2f}%, '
+          f'mismatched rows: {report["mismatched_rows"]}, mean |Δp|: {report["mean_abs_prob_diff"]}')
+    for behavior, stats in report['behaviors'].items():
+        print(f'  {behavior:<8} reference: {stats["rows_reference"]:>7}  compared: {stats["rows_compared"]:>7}  '
+              f'both: {stats["rows_both"]:>7}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the ethogram of a strided run with the stride-1 run')
+    parser.add_argument('reference', help='_beh.csv of the stride-1 run')
+    parser.add_argument('compared', help='_beh.csv of the strided run')
+    parser.add_argument('--json', help='save the report to this file')
+    args = parser.parse_args()
+
+    report = EthogramComparator(args.reference, args.compared).compare()
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=4)
@@ -0,0 +1,83 @@
+import numpy as np
+
+from scipy.signal import lfilter
+
+GAIN_TOLERANCE = 1e-13
+MAX_TRANSIENT_STEPS = 10000
+MAX_EIGENVECTORS_CONDITION = 1e8
+
+
+# Kalman filter for a time-invariant model with the semantics of pykalman.KalmanFilter.filter:
+# the first step corrects the initial mean with the initial covariance, without a prediction.
+# The covariances do not depend on the observations, so the gains are computed once. While they change,
+# the filter steps one by one; after that x[t] = F x[t-1] + K z[t] with the constant F = (I - K H) A,
+# which is split by the eigenvectors of F into independent first-order recursions run by lfilter
+class SteadyStateKalmanFilter:
+    def __init__(self, transition_matrix, observation_matrix, transition_covariance, observation_covariance,
+                 initial_state_covariance=None):
+        self.transition_matrix = np.asarray(transition_matrix, dtype=np.float64)
+        self.observation_matrix = np.asarray(observation_matrix, dtype=np.float64)
+        self.transition_covariance = np.asarray(transition_covariance, dtype=np.float64)
+        self.observation_covariance = np.asarray(observation_covariance, dtype=np.float64)
+        count_states = self.transition_matrix.shape[0]
+        self.initial_state_covariance = np.eye(count_states) if initial_state_covariance is None \
+            else np.asarray(initial_state_covariance, dtype=np.float64)
+
+        self.transient_gains, self.steady_gain = self.compute_gains()
+        self.steady_matrix = (np.eye(count_states) - self.steady_gain @ self.observation_matrix) @ self.transition_matrix
+
+    def compute_gain(self, predicted_covariance):
+        H = self.observation_matrix
+        innovation_covariance = H @ predicted_covariance @ H.T + self.observation_covariance
+        gain = predicted_covariance @ H.T @ np.linalg.pinv(innovation_covariance)
+        return gain, predicted_covariance - gain @ H @ predicted_covariance
+
+    def compute_gains(self):
+        A = self.transition_matrix
+        gain, covariance = self.compute_gain(self.initial_state_covariance)
+        gains = [gain]
+        for _ in range(MAX_TRANSIENT_STEPS):
+            gain, covariance = self.compute_gain(A @ covariance @ A.T + self.transition_covariance)
+            if np.abs(gain - gains[-1]).max() < GAIN_TOLERANCE:
+                return gains, gain
+            gains.append(gain)
+        return gains, gains[-1]
+
+    def filter(self, observations, initial_state_mean) -> np.ndarray:
+        observations = np.asarray(observations, dtype=np.float64)
+        count_steps = len(observations)
+        A, H = self.transition_matrix, self.observation_matrix
+        means = np.zeros((count_steps, A.shape[0]))
+
+        state = np.asarray(initial_state_mean, dtype=np.float64)
+        count_transient = min(count_steps, len(self.transient_gains))
+        for t in range(count_transient):
+            predicted = state if t == 0 else A @ state
+            state = predicted + self.transient_gains[t] @ (observations[t] - H @ predicted)
+            means[t] = state
+
+        if count_steps > count_transient:
+            inputs = observations[count_transient:] @ self.steady_gain.T
+            means[count_transient:] = self.run_steady_recursion(inputs, state)
+        return means
+
+    def run_steady_recursion(self, inputs: np.ndarray, state: np.ndarray) -> np.ndarray:
+        eigenvalues, eigenvectors = np.linalg.eig(self.steady_matrix)
+        if np.linalg.cond(eigenvectors) > MAX_EIGENVECTORS_CONDITION:
+            return self.run_steady_loop(inputs, state)
+
+        inverse = np.linalg.inv(eigenvectors)
+        modal_inputs = inputs @ inverse.T
+        modal_state = inverse @ state
+        modal_means = np.empty(modal_inputs.shape, dtype=np.result_type(modal_inputs, eigenvalues))
+        for index, eigenvalue in enumerate(eigenvalues):
+            modal_means[:, index], _ = lfilter([1.0], [1.0, -eigenvalue], modal_inputs[:, index],
+                                               zi=[eigenvalue * modal_state[index]])
+        return np.real(modal_means @ eigenvectors.T)
+
+    def run_steady_loop(self, inputs: np.ndarray, state: np.ndarray) -> np.ndarray:
+        means = np.empty(inputs.shape)
+        for t in range(len(inputs)):
+            state = self.steady_matrix @ state + inputs[t]
+            means[t] = state
+        return means
@@ -0,0 +1,54 @@
+import numpy as np
+
+KEYPOINT_NAMES = ('point_nose', 'point_r_ear', 'point_l_ear', 'point_near', 'point_r_side', 'point_l_side', 'point_tail')
+DEFAULT_CAPACITY = 1024
+
+
+class KeypointStore:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        capacity = max(1, capacity)
+        self.keypoints = np.zeros((capacity, len(KEYPOINT_NAMES), 2), dtype=np.int64)
+        self.found = np.zeros(capacity, dtype=bool)
+        self.count_frames = 0
+
+    # Frame numbers start from 1, as in MouseDetector
+    def add(self, frame_number: int, info_mouse: dict):
+        index = frame_number - 1
+        self.ensure_capacity(index + 1)
+        if info_mouse:
+            self.keypoints[index] = [info_mouse[name] for name in KEYPOINT_NAMES]
+            self.found[index] = True
+        else:
+            self.found[index] = False
+        self.count_frames = max(self.count_frames, index + 1)
+
+    def ensure_capacity(self, count_frames: int):
+        capacity = len(self.found)
+        if count_frames <= capacity:
+            return
+        while capacity < count_frames:
+            capacity *= 2
+        keypoints = np.zeros((capacity,) + self.keypoints.shape[1:], dtype=self.keypoints.dtype)
+        keypoints[:len(self.keypoints)] = self.keypoints
+        found = np.zeros(capacity, dtype=bool)
+        found[:len(self.found)] = self.found
+        self.keypoints = keypoints
+        self.found = found
+
+    def get_state(self) -> dict:
+        return {
+            'keypoints': self.keypoints[:self.count_frames].copy(),
+            'found': self.found[:self.count_frames].copy()
+        }
+
+    def set_state(self, state: dict):
+        count_frames = len(state['found'])
+        self.ensure_capacity(count_frames)
+        self.keypoints[:count_frames] = state['keypoints']
+        self.found[:count_frames] = state['found']
+        self.count_frames = count_frames
+
+    def get_found(self) -> tuple[np.ndarray, np.ndarray]:
+        found = self.found[:self.count_frames]
+        frame_numbers = np.flatnonzero(found) + 1
+        return frame_numbers, self.keypoints[:self.count_frames][found]
@@ -5,11 +5,43 @@ import time
 PATH_TO_WEIGHT_YOLO = 'weights/weights_yolo.pt'
 PATH_TO_BEHAVIOR_WEIGHT_YOLO = 'weights/behavior_weights_yolo.pt'
 PATH_TO_VIDEO = 'test114_1.mp4'
+BATCH_SIZE = 1
+DO_PIPELINE = False
+BEHAVIOR_STRIDE = 1
+DO_ARENA_ROI = False
+DO_TRACKING = False
+DO_DOWNSCALE_BEHAVIOR_BUFFER = False
+DO_FAST_ARENA_DETECTION = False
+ARENA_FRAMES = 1
+ARENA_CALIBRATION_PATH = None
+CHECKPOINT_INTERVAL = None
+DO_RESUME = False
+DO_RAW_CACHE = False
+EXPORT_FORMAT = 'parquet'
+PLOT_PROFILE = 'publication'
+PLOT_VECTOR_FORMATS = ()
+PLOT_WORKERS = 2
+DO_DECIMATE_PLOTS = False
+VIDEO_OUTPUT_SIZE = None
+VIDEO_FRAME_SKIP = 1
+VIDEO_FOURCC = 'H264'
 
 if __name__ == "__main__":
     start = time.time()
 
-    mouse_detector = MouseDetector(PATH_TO_VIDEO, PATH_TO_WEIGHT_YOLO, PATH_TO_BEHAVIOR_WEIGHT_YOLO, True, True)
+    mouse_detector = MouseDetector(PATH_TO_VIDEO, PATH_TO_WEIGHT_YOLO, PATH_TO_BEHAVIOR_WEIGHT_YOLO, True, True,
+                                   batch_size=BATCH_SIZE, do_pipeline=DO_PIPELINE,
+                                   behavior_stride=BEHAVIOR_STRIDE, do_arena_roi=DO_ARENA_ROI,
+                                   do_tracking=DO_TRACKING,
+                                   do_downscale_behavior_buffer=DO_DOWNSCALE_BEHAVIOR_BUFFER,
+                                   do_fast_arena_detection=DO_FAST_ARENA_DETECTION, arena_frames=ARENA_FRAMES,
+                                   arena_calibration_path=ARENA_CALIBRATION_PATH,
+                                   checkpoint_interval=CHECKPOINT_INTERVAL, do_resume=DO_RESUME,
+                                   do_raw_cache=DO_RAW_CACHE, export_format=EXPORT_FORMAT,
+                                   plot_profile=PLOT_PROFILE, plot_vector_formats=PLOT_VECTOR_FORMATS,
+                                   plot_workers=PLOT_WORKERS, do_decimate_plots=DO_DECIMATE_PLOTS,
+                                   video_output_size=VIDEO_OUTPUT_SIZE, video_frame_skip=VIDEO_FRAME_SKIP,
+                                   video_fourcc=VIDEO_FOURCC)
     mouse_detector.detect()
 
     end = time.time()
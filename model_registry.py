@@ -0,0 +1,123 @@
+import importlib.util
+import os
+import threading
+import time
+
+import numpy as np
+
+from ultralytics import YOLO
+
+WARMUP_IMAGE_SHAPE = (640, 640, 3)
+BACKENDS = ('torch', 'onnx', 'openvino')
+EXPORT_SUFFIXES = {'onnx': '.onnx', 'openvino': '_openvino_model'}
+
+
+def get_exported_path(path: str, backend: str) -> str:
+    return os.path.splitext(path)[0] + EXPORT_SUFFIXES[backend]
+
+
+def is_backend_available(backend: str) -> bool:
+    if backend == 'torch':
+        return True
+    module = 'onnxruntime' if backend == 'onnx' else 'openvino'
+    return importlib.util.find_spec(module) is not None
+
+
+# Exported models are cached next to the .pt file and re-exported when the .pt file is newer
+def resolve_weights(path: str, backend: str = 'torch') -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"[ERROR]: Unknown backend {backend}, expected one of {BACKENDS}")
+    if backend == 'torch':
+        return path
+
+    exported_path = get_exported_path(path, backend)
+    if os.path.exists(exported_path) and os.path.getmtime(exported_path) >= os.path.getmtime(path):
+        return exported_path
+
+    print(f'Exporting {path} to {backend}')
+    return str(YOLO(path).export(format=backend, dynamic=True))
+
+
+# The backend a model is actually loaded with: a missing runtime falls back to torch
+def resolve_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"[ERROR]: Unknown backend {backend}, expected one of {BACKENDS}")
+    if backend != 'torch' and not is_backend_available(backend):
+        print(f'[WARNING]: Backend {backend} is not installed, falling back to torch')
+        return 'torch'
+    return backend
+
+
+# Callers that report the backend resolve it first with resolve_backend and pass the result here
+def load_model(path: str, backend: str = 'torch', task: str = None) -> YOLO:
+    backend = resolve_backend(backend)
+    if backend == 'torch':
+        return YOLO(path)
+    return YOLO(resolve_weights(path, backend), task=task)
+
+
+class ModelEntry:
+    def __init__(self, model, path, backend, mtime, load_time, warmup_time):
+        self.model = model
+        self.path = path
+        self.backend = backend
+        self.mtime = mtime
+        self.load_time = load_time
+        self.warmup_time = warmup_time
+        self.count_requests = 0
+        # Ultralytics predictors are not thread-safe, so callers sharing a model take this lock around inference
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, path: str, backend: str = 'torch', task: str = None) -> YOLO:
+        return self.get_entry(path, backend, task).model
+
+    def get_entry(self, path: str, backend: str = 'torch', task: str = None) -> ModelEntry:
+        if not os.path.exists(path):
+            raise ValueError(f"[ERROR]: Couldn't find the weights {path}")
+
+        key = (os.path.abspath(path), backend, os.path.getmtime(path))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.drop_stale_entries(key)
+                entry = self.load(path, backend, task, key[2])
+                self.entries[key] = entry
+            entry.count_requests += 1
+        return entry
+
+    def drop_stale_entries(self, key):
+        for stale_key in [other for other in self.entries if other[:2] == key[:2]]:
+            del self.entries[stale_key]
+
+    def load(self, path: str, backend: str, task: str, mtime: float) -> ModelEntry:
+        backend = resolve_backend(backend)
+        start = time.perf_counter()
+        model = load_model(path, backend, task)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        model(np.zeros(WARMUP_IMAGE_SHAPE, dtype=np.uint8))
+        warmup_time = time.perf_counter() - start
+
+        print(f'Loaded {path} ({backend}): load {load_time:.2f} s, warm-up {warmup_time:.2f} s')
+        return ModelEntry(model, path, backend, mtime, load_time, warmup_time)
+
+    def stats(self) -> list:
+        with self.lock:
+            return [{
+                'path': entry.path,
+                'backend': entry.backend,
+                'mtime': entry.mtime,
+                'load_time': round(entry.load_time, 3),
+                'warmup_time': round(entry.warmup_time, 3),
+                'requests': entry.count_requests
+            } for entry in self.entries.values()]
+
+
+MODEL_REGISTRY = ModelRegistry()
@@ -1,89 +1,273 @@
 import cv2
 import numpy as np
 import os
-import csv
+import time
 
 from typing import List
-from ultralytics import YOLO
-from analytic_image_processor import AnalyticImageProcessor
-from behavior_analyzer import BehaviorAnalyzer
-from calculator import Calculator
-from calculator_speed import CalculatorSpeed
+from analytic_image_processor import AnalyticImageProcessor, median_info_arena
+from arena_calibration import ArenaCalibrationStore
+from behavior_analyzer import BehaviorAnalyzer, DEFAULT_STRIDE
+from bouts import summarize_bouts
+from checkpoint import CheckpointStore
 from csv_combiner import CSVCombiner
-from plotter import Plotter
+from crop_window import CropWindow, get_inference_size, DEFAULT_ROI_MARGIN
+from csv_writer import CSVWriterSession
+from keypoint_store import KeypointStore
+from model_registry import load_model, resolve_backend
+from mouse_tracker import MouseTracker, DEFAULT_MIN_WINDOW_SIZE, DEFAULT_MIN_CONFIDENCE
+from plotter import Plotter, DEFAULT_PLOT_PROFILE
+from profiler import Profiler
+from raw_cache import RawCache, get_path_raw_cache, get_weights_id
+from session_analytics import SessionAnalytics, STATIC_CSV_HEADER
+from session_export import DEFAULT_EXPORT_FORMAT
+from video_encoder import VideoEncoder, DEFAULT_FOURCC, DEFAULT_ENCODER_QUEUE_SIZE
+from video_pipeline import VideoPipeline, DEFAULT_QUEUE_SIZE
+
+DEFAULT_BATCH_SIZE = 1
+DEFAULT_POSE_IMGSZ = 640
+ROI_BENCHMARK_REPEATS = 5
+# The behavior analyzer and the arena detection read two frames before the processing starts
+COUNT_FRAMES_BEFORE_PROCESSING = 2
+
+
+# Size of the longest side of a full frame in the input of the pose model
+def get_pose_input_size(model) -> int:
+    imgsz = model.overrides.get('imgsz', DEFAULT_POSE_IMGSZ)
+    if isinstance(imgsz, (list, tuple)):
+        imgsz = max(imgsz)
+    return imgsz
 
 
 class MouseDetector:
     def __init__(self, path_to_video: str, path_to_weight_yolo: str,
-                 path_to_behavior_weight_yolo: str, do_output_video: bool = False, do_plot_graphs: bool = True):
+                 path_to_behavior_weight_yolo: str, do_output_video: bool = False, do_plot_graphs: bool = True,
+                 batch_size: int = DEFAULT_BATCH_SIZE, do_pipeline: bool = False,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, behavior_stride: int = DEFAULT_STRIDE,
+                 behavior_interpolation: str = 'linear', model=None, behavior_model=None,
+                 backend: str = 'torch', do_arena_roi: bool = False, roi_margin: float = DEFAULT_ROI_MARGIN,
+                 roi_max_size: int = None, do_tracking: bool = False,
+                 tracking_window_size: int = DEFAULT_MIN_WINDOW_SIZE,
+                 tracking_min_confidence: float = DEFAULT_MIN_CONFIDENCE, do_downscale_behavior_buffer: bool = False,
+                 do_fast_arena_detection: bool = False, arena_frames: int = 1, arena_calibration_path: str = None,
+                 checkpoint_interval: int = None, do_resume: bool = False, do_fast_resume_seek: bool = False,
+                 do_raw_cache: bool = False, export_format: str = DEFAULT_EXPORT_FORMAT,
+                 plot_profile: str = DEFAULT_PLOT_PROFILE, plot_vector_formats: tuple = (), plot_workers: int = None,
+                 do_decimate_plots: bool = False,
+                 video_output_size: tuple = None, video_frame_skip: int = 1, video_fourcc: str = DEFAULT_FOURCC,
+                 video_queue_size: int = DEFAULT_ENCODER_QUEUE_SIZE):
+
+        if batch_size < 1:
+            raise ValueError(f"[ERROR]: Batch size must be positive, got {batch_size}")
+        if arena_frames < 1:
+            raise ValueError(f"[ERROR]: Count of frames for the arena must be positive, got {arena_frames}")
+        if checkpoint_interval is not None and checkpoint_interval < 1:
+            raise ValueError(f"[ERROR]: Checkpoint interval must be positive, got {checkpoint_interval}")
 
         self.path_to_video = path_to_video
+        self.batch_size = batch_size
+        self.do_pipeline = do_pipeline
+        self.queue_size = queue_size
+        self.frame_count = 0
+        self.behavior_stride = behavior_stride
+        self.behavior_interpolation = behavior_interpolation
+        self.do_downscale_behavior_buffer = do_downscale_behavior_buffer
+        self.pipeline_report = None
+        self.run_report = None
+        self.profiler = Profiler()
         self.input_video = cv2.VideoCapture(path_to_video)
         self.do_output_video = do_output_video
         self.do_plot_graphs = do_plot_graphs
-        self.output_video = self.create_output_video()
+        self.video_output_size = video_output_size
+        self.video_frame_skip = video_frame_skip
+        self.video_fourcc = video_fourcc
+        self.video_queue_size = video_queue_size
         self.radius_arena = None
+        self.reference_frame = None
+        self.do_fast_arena_detection = do_fast_arena_detection
+        self.arena_frames = arena_frames
+        self.arena_calibration = ArenaCalibrationStore(arena_calibration_path) if arena_calibration_path else None
+        self.do_arena_roi = do_arena_roi
+        self.roi_margin = roi_margin
+        self.roi_max_size = roi_max_size
+        self.arena_window = None
+        self.roi_report = None
+        self.tracker = MouseTracker(tracking_window_size, tracking_min_confidence) if do_tracking else None
+        self.info_arena = None
+        self.do_raw_cache = do_raw_cache
+        self.export_format = export_format
+        self.path_to_session_data = None
+        self.session_data = None
+        self.path_to_bouts = None
+        self.bouts = None
+        self.bout_stats = None
+        self.plot_profile = plot_profile
+        self.plot_vector_formats = plot_vector_formats
+        self.plot_workers = plot_workers
+        self.do_decimate_plots = do_decimate_plots
+        self.plot_report = None
+        self.path_to_weight_yolo = path_to_weight_yolo
+        self.path_to_behavior_weight_yolo = path_to_behavior_weight_yolo
 
         if not self.input_video.isOpened():
             self.input_video.release()
             raise ValueError(f"[ERROR]: Couldn't open the video {path_to_video}")
 
+        self.count_video_frames = int(self.input_video.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.checkpoint_interval = checkpoint_interval
+        self.do_fast_resume_seek = do_fast_resume_seek
+        self.checkpoint_store = CheckpointStore(self.get_path_checkpoint())
+        self.checkpoint = self.load_checkpoint() if do_resume else None
+        self.resumed_from_frame = self.checkpoint['frame_count'] if self.checkpoint is not None else None
+        self.tracker_states = {}
+        self.output_video = self.create_output_video()
+
         self.output_name_csv = self.get_name_output_csv(path_to_video)
-        self.model = YOLO(path_to_weight_yolo)
-        self.calculator_speed = CalculatorSpeed()
+        self.backend = resolve_backend(backend)
+        self.model = model if model is not None else load_model(path_to_weight_yolo, self.backend, 'pose')
+        self.pose_imgsz = get_pose_input_size(self.model)
+        self.behavior_model = behavior_model
+        self.keypoint_store = KeypointStore(self.count_video_frames)
+        self.csv_session = CSVWriterSession(
+            resume_offsets=self.checkpoint['csv_offsets'] if self.checkpoint is not None else None)
         self.behavior_analyzer = self.init_behavior_analyzer(path_to_behavior_weight_yolo, path_to_video)
 
-        with open(f'{self.output_name_csv}.csv', 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['Time, m:s', 'X, px', 'Y, px', 'Central zone',
-                             'Internal zone', 'Middle zone', 'Outer zone', 'Angle btw head&body, degrees', 'Speed, m/s'])
+        self.csv_writer = self.csv_session.open('static', f'{self.output_name_csv}.csv', STATIC_CSV_HEADER)
 
     def init_behavior_analyzer(self, path_to_behavior_weight_yolo, path_to_video):
         _, frame = self.input_video.read()
         height, weight, _ = frame.shape
-        return BehaviorAnalyzer(height, weight, path_to_behavior_weight_yolo, path_to_video)
+        return BehaviorAnalyzer(height, weight, path_to_behavior_weight_yolo, path_to_video, self.csv_session,
+                                self.behavior_stride, self.behavior_interpolation, self.behavior_model,
+                                self.backend, self.profiler, self.do_downscale_behavior_buffer)
 
     def detect(self):
-        info_arena = self.search_center_and_zones()
+        start = time.perf_counter()
+        with self.profiler.measure('arena detection'):
+            if self.checkpoint is None:
+                info_arena = self.search_center_and_zones()
+            else:
+                info_arena = self.restore_checkpoint()
+        self.info_arena = info_arena
+
+        if self.do_arena_roi:
+            self.arena_window = CropWindow.from_arena(info_arena, self.reference_frame.shape,
+                                                      self.roi_margin, self.roi_max_size)
+            self.roi_report = self.benchmark_arena_roi(self.reference_frame)
 
         self.processing_video(info_arena)
 
         if self.do_plot_graphs:
-            self.plot_graphs()
+            with self.profiler.measure('plot'):
+                self.plot_graphs()
+
+        self.profiler.add('total', time.perf_counter() - start, self.frame_count)
+        self.save_run_report()
 
     def processing_video(self, info_arena):
-        frame_number = 0
         fps = self.input_video.get(cv2.CAP_PROP_FPS)
 
+        try:
+            if self.do_output_video:
+                self.output_video.start(info_arena)
+            if self.do_pipeline:
+                self.processing_video_pipelined(info_arena, fps)
+            else:
+                self.processing_video_serial(info_arena, fps)
+            self.behavior_analyzer.finish()
+            self.export_static_data(info_arena, fps)
+        finally:
+            with self.profiler.measure('csv io', 0):
+                self.csv_session.close()
+            self.release_video()
+
+        if self.do_raw_cache:
+            with self.profiler.measure('raw cache'):
+                self.save_raw_cache(info_arena, fps)
+
+        with self.profiler.measure('combine'):
+            self.combine_csv_files()
+        self.checkpoint_store.remove()
+
+    def processing_video_serial(self, info_arena, fps):
         while True:
-            ret, frame = self.input_video.read()
-            if not ret:
+            batch = self.decode_batch()
+            if batch is None:
                 break
 
-            info_mouse = self.search_mouse(frame)
-
-            frame_number += 1
-
-            if self.is_mouse_found(info_mouse):
-                self.analyze_behavior_of_mouse(frame)
-
-                data = self.calculate_data(frame_number, fps, info_mouse, info_arena)
-                self.export_to_csv(data)
-
+            batch = self.infer_batch(batch)
+            self.analyze_batch(batch)
             if self.do_output_video:
-                frame_with_all = self.draw(frame.copy(), info_mouse, info_arena)
-                self.output_video.write(frame_with_all)
+                self.write_batch(batch)
 
-        self.release_video()
-        self.combine_csv_files()
+    def processing_video_pipelined(self, info_arena, fps):
+        pipeline = VideoPipeline(self.queue_size)
+        pipeline.add_stage('decode', self.decode_batch)
+        pipeline.add_stage('inference', self.infer_batch)
+        pipeline.add_stage('analysis', self.analyze_batch)
+        if self.do_output_video:
+            pipeline.add_stage('writing', self.write_batch)
+
+        try:
+            pipeline.run()
+        finally:
+            self.pipeline_report = pipeline.report()
+            pipeline.print_report()
+
+    def decode_batch(self):
+        start = time.perf_counter()
+        frames = self.read_frames(self.batch_size)
+        self.profiler.add('decoding', time.perf_counter() - start, len(frames))
+        if not frames:
+            return None
 
-    def calculate_data(self, frame_number, fps, info_mouse, info_arena):
-        time_frame = self.get_time_frame(frame_number, fps)
-        static_data = self.calculate_static_parameters_of_mouse(info_mouse, info_arena, time_frame)
+        batch = []
+        for frame in frames:
+            self.frame_count += 1
+            batch.append((self.frame_count, frame))
+        return batch
+
+    def infer_batch(self, batch):
+        with self.profiler.measure('pose inference', len(batch)):
+            infos_mouse = self.search_mice([frame for _, frame in batch])
+        # The inference stage runs ahead of the analysis in the pipeline, so the tracker is saved here
+        if self.tracker is not None and self.is_checkpoint_batch(batch):
+            self.tracker_states[batch[-1][0]] = self.tracker.get_state()
+        return [(frame_number, frame, info_mouse) for (frame_number, frame), info_mouse in zip(batch, infos_mouse)]
+
+    def analyze_batch(self, batch):
+        for frame_number, frame, info_mouse in batch:
+            self.analyze_frame(frame, info_mouse, frame_number)
+        if self.is_checkpoint_batch(batch):
+            with self.profiler.measure('checkpoint', 0):
+                self.save_checkpoint(batch[-1][0])
+        return batch
+
+    # The overlay is drawn and encoded by the encoder thread, here the frames only wait for a place in its queue
+    def write_batch(self, batch):
+        with self.profiler.measure('video queue', len(batch)):
+            for frame_number, frame, info_mouse in batch:
+                self.output_video.write(frame_number, frame, info_mouse)
+
+    def read_frames(self, count: int) -> List[np.ndarray]:
+        frames = []
+        while len(frames) < count:
+            ret, frame = self.input_video.read()
+            if not ret:
+                break
+            frames.append(frame)
+        return frames
+
+    def analyze_frame(self, frame, info_mouse, frame_number):
+        self.keypoint_store.add(frame_number, info_mouse)
+        if self.is_mouse_found(info_mouse):
+            self.analyze_behavior_of_mouse(frame)
 
-        speed = self.calculate_speed(info_mouse, info_arena['radius_arena'], frame_number, fps)
-        static_data.append(speed)
-        return static_data
+    def export_static_data(self, info_arena, fps):
+        frame_numbers, keypoints = self.keypoint_store.get_found()
+        with self.profiler.measure('session analytics', len(frame_numbers)):
+            rows = SessionAnalytics(info_arena, fps).calculate(frame_numbers, keypoints)
+        for row_data in rows:
+            self.export_to_csv(row_data)
 
     def analyze_behavior_of_mouse(self, frame):
         self.behavior_analyzer.update_buffer(frame)
@@ -92,25 +276,124 @@ class MouseDetector:
 
     def search_center_and_zones(self) -> dict:
         _, frame = self.input_video.read()
-        frame_analyzer = AnalyticImageProcessor(frame)
-        frame_analyzer.search_zones()
-        info_arena = {
-            'x_center': frame_analyzer.x_center,
-            'y_center': frame_analyzer.y_center,
-            'radius_arena': frame_analyzer.radius_arena,
-            'central_zone': frame_analyzer.central_zone,
-            'internal_zone': frame_analyzer.internal_zone,
-            'middle_zone': frame_analyzer.middle_zone,
-            'outer_zone': frame_analyzer.outer_zone
-        }
+        self.reference_frame = frame
+        info_arena = self.arena_calibration.lookup(frame) if self.arena_calibration is not None else None
+        if info_arena is None:
+            if self.arena_frames > 1:
+                info_arena = median_info_arena(self.search_arena_on_first_frames(self.arena_frames))
+            else:
+                info_arena = self.search_arena(frame)
+            if self.arena_calibration is not None:
+                self.arena_calibration.save_arena(frame, info_arena)
 
         self.radius_arena = info_arena['radius_arena']
 
         return info_arena
 
-    def search_mouse(self, image: np.ndarray) -> dict:
-        results = self.model(image)
-        xy = results[0].keypoints.xy.cpu().numpy().astype(int)
+    def search_arena(self, frame: np.ndarray) -> dict:
+        frame_analyzer = AnalyticImageProcessor(frame, self.do_fast_arena_detection)
+        frame_analyzer.search_zones()
+        return frame_analyzer.get_info_arena()
+
+    # The frames are read by a separate capture, so the processed stream keeps its position;
+    # frames where the arena was not found are skipped
+    def search_arena_on_first_frames(self, count_frames: int) -> List[dict]:
+        video = cv2.VideoCapture(self.path_to_video)
+        infos_arena = []
+        try:
+            for _ in range(count_frames):
+                ret, frame = video.read()
+                if not ret:
+                    break
+                try:
+                    infos_arena.append(self.search_arena(frame))
+                except (ValueError, ZeroDivisionError, cv2.error) as error:
+                    print(f'[WARNING]: Arena was not found on a frame: {error}')
+        finally:
+            video.release()
+        return infos_arena
+
+    def search_mouse(self, image: np.ndarray, window: CropWindow = None) -> dict:
+        results = self.run_pose_model([image], [window])
+        return self.get_info_mouse(results[0], window)
+
+    def search_mice(self, images: List[np.ndarray]) -> List[dict]:
+        if self.tracker is not None:
+            return self.search_mice_tracked(images)
+        windows = [self.arena_window] * len(images)
+        results = self.run_pose_model(images, windows)
+        return [self.get_info_mouse(result, window) for result, window in zip(results, windows)]
+
+    # Crops are run at their own input size, see CropWindow.get_imgsz; a batch of crops takes the largest one
+    def run_pose_model(self, images: List[np.ndarray], windows: List[CropWindow]):
+        inputs = [image if window is None else window.crop(image) for image, window in zip(images, windows)]
+        source = inputs[0] if len(inputs) == 1 else inputs
+        if any(window is None for window in windows):
+            return self.model(source)
+        imgsz = np.max([window.get_imgsz(self.pose_imgsz) for window in windows], axis=0).tolist()
+        return self.model(source, imgsz=imgsz)
+
+    # Frames are first searched in the window predicted by the tracker. A miss or a low-confidence result
+    # falls back to the usual search over the full frame (or the arena crop)
+    def search_mice_tracked(self, images: List[np.ndarray]) -> List[dict]:
+        windows = [self.tracker.predict_window(image.shape, index + 1) for index, image in enumerate(images)]
+        infos_mouse = [None] * len(images)
+
+        indices_tracked = [index for index, window in enumerate(windows) if window is not None]
+        if indices_tracked:
+            with self.profiler.measure('pose window search', len(indices_tracked)):
+                results = self.run_pose_model([images[index] for index in indices_tracked],
+                                              [windows[index] for index in indices_tracked])
+            for index, result in zip(indices_tracked, results):
+                info_mouse = self.get_info_mouse(result, windows[index])
+                if self.is_mouse_found(info_mouse) and self.tracker.is_confident(self.get_confidence(result)):
+                    infos_mouse[index] = info_mouse
+
+        indices_full = [index for index, info_mouse in enumerate(infos_mouse) if info_mouse is None]
+        is_full_search = set(indices_full)
+        if indices_full:
+            windows_full = [self.arena_window] * len(indices_full)
+            with self.profiler.measure('pose full search', len(indices_full)):
+                results = self.run_pose_model([images[index] for index in indices_full], windows_full)
+            for index, result in zip(indices_full, results):
+                infos_mouse[index] = self.get_info_mouse(result, self.arena_window)
+
+        for index, info_mouse in enumerate(infos_mouse):
+            had_window = windows[index] is not None
+            self.tracker.update(info_mouse, had_window, had_window and index in is_full_search)
+        return infos_mouse
+
+    # A run without tracking makes a full search on every frame, so the measured cost of a full search is
+    # compared with the cost per frame of the window searches and the fallbacks together
+    def get_tracking_report(self) -> dict:
+        report = self.tracker.report()
+        stages = self.profiler.report()
+        window_search = stages.get('pose window search', {'total_s': 0.0, 'frames': 0})
+        full_search = stages.get('pose full search', {'total_s': 0.0, 'frames': 0})
+        count_frames = window_search['frames'] + full_search['frames'] - report['fallbacks']
+        total = window_search['total_s'] + full_search['total_s']
+        report['window_search_ms'] = round(window_search['total_s'] / window_search['frames'] * 1000, 3) \
+            if window_search['frames'] else None
+        report['full_search_ms'] = round(full_search['total_s'] / full_search['frames'] * 1000, 3) \
+            if full_search['frames'] else None
+        report['per_frame_ms'] = round(total / count_frames * 1000, 3) if count_frames else None
+        report['speedup'] = round(report['full_search_ms'] / report['per_frame_ms'], 2) \
+            if report['full_search_ms'] and report['per_frame_ms'] else None
+        print(f'Tracking: {report["full_search_ms"]} ms per frame without tracking, {report["per_frame_ms"]} ms with '
+              f'it ({report["window_search_ms"]} ms per window search, fallback rate {report["fallback_rate"]})')
+        return report
+
+    def get_confidence(self, result) -> float:
+        if result.boxes is None or len(result.boxes) == 0:
+            return 0.0
+        return float(result.boxes.conf[0])
+
+    # Keypoints found in a crop are mapped back to the full frame, so the analytics and draw do not change
+    def get_info_mouse(self, result, window: CropWindow = None) -> dict:
+        xy = result.keypoints.xy.cpu().numpy()
+        if window is not None:
+            xy = window.to_frame_coordinates(xy)
+        xy = xy.astype(int)
         if len(xy[0]) != 0:
             info_mouse = {
                 'point_nose': xy[0][0],
@@ -125,6 +408,31 @@ class MouseDetector:
         else:
             return {}
 
+    # Both modes run a batch of the processing size through run_pose_model, as the processing does,
+    # and the latency is per frame
+    def benchmark_arena_roi(self, frame: np.ndarray) -> dict:
+        frames = [frame] * self.batch_size
+        latencies = {}
+        for name, window in (('full_frame', None), ('arena_roi', self.arena_window)):
+            windows = [window] * self.batch_size
+            self.run_pose_model(frames, windows)
+            start = time.perf_counter()
+            for _ in range(ROI_BENCHMARK_REPEATS):
+                self.run_pose_model(frames, windows)
+            latencies[name] = (time.perf_counter() - start) / ROI_BENCHMARK_REPEATS / self.batch_size
+
+        height, width = frame.shape[:2]
+        report = self.arena_window.to_dict()
+        report['full_frame_imgsz'] = get_inference_size(height, width, self.pose_imgsz / max(height, width))
+        report['arena_roi_imgsz'] = self.arena_window.get_imgsz(self.pose_imgsz)
+        report['full_frame_ms'] = round(latencies['full_frame'] * 1000, 2)
+        report['arena_roi_ms'] = round(latencies['arena_roi'] * 1000, 2)
+        report['speedup'] = round(latencies['full_frame'] / latencies['arena_roi'], 2)
+        print(f'Arena ROI {report["box"]}: {report["pixel_reduction"] * 100:.1f}% fewer pixels, model input '
+              f'{report["full_frame_imgsz"]} -> {report["arena_roi_imgsz"]}, '
+              f'{report["full_frame_ms"]} ms -> {report["arena_roi_ms"]} ms per frame ({report["speedup"]}x)')
+        return report
+
     def is_mouse_found(self, info_mouse: dict) -> bool:
         return len(info_mouse) != 0
 
@@ -135,41 +443,26 @@ class MouseDetector:
             directory = os.path.dirname(self.path_to_video)
             filename = os.path.basename(self.path_to_video)
             processed_filename = f'processed_{filename}'
+            # A resumed run writes the rest of the video to a separate part
+            if self.resumed_from_frame is not None:
+                stem, extension = os.path.splitext(filename)
+                processed_filename = f'processed_{stem}_from{self.resumed_from_frame + 1}{extension}'
             output_path = os.path.join(directory, processed_filename)
             print(f'Creating: {output_path}')
-            output_video = cv2.VideoWriter(output_path,
-                                           cv2.VideoWriter_fourcc(*'H264'),
-                                           self.input_video.get(cv2.CAP_PROP_FPS),
-                                           (int(self.input_video.get(cv2.CAP_PROP_FRAME_WIDTH)),
-                                            int(self.input_video.get(cv2.CAP_PROP_FRAME_HEIGHT))))
-            print(output_video)
-            return output_video
+            return VideoEncoder(output_path, self.input_video.get(cv2.CAP_PROP_FPS),
+                                (int(self.input_video.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                 int(self.input_video.get(cv2.CAP_PROP_FRAME_HEIGHT))),
+                                self.video_output_size, self.video_frame_skip, self.video_fourcc,
+                                self.video_queue_size, self.profiler)
         else:
             return None
 
     def release_video(self):
         self.input_video.release()
         if self.do_output_video:
-            self.output_video.release()
+            self.output_video.close()
         cv2.destroyAllWindows()
 
-    def get_time_frame(self, frame_number: int, fps: float):
-        current_time_seconds = frame_number / fps
-        minutes, seconds = divmod(current_time_seconds, 60)
-        minutes_str = f'{int(minutes):02d}'
-        seconds_str = f'{seconds:05.2f}'.replace('.', ',')
-        return minutes_str, seconds_str
-
-    def calculate_static_parameters_of_mouse(self, info_mouse: dict, info_arena: dict, time_frame: tuple[str, str]) -> List:
-        calculator = Calculator(info_mouse, info_arena, time_frame)
-        return calculator.calculate()
-
-
-    def calculate_speed(self, info_mouse, radius_arena, frame_number, fps):
-        current_time_seconds = frame_number / fps
-        speed = self.calculator_speed.update(info_mouse, radius_arena, current_time_seconds)
-        return speed
-
     def get_name_output_csv(self, path_to_video: str):
         output_filename = os.path.basename(path_to_video)
         name = output_filename.split('.')[0] + '_static'
@@ -177,44 +470,152 @@ class MouseDetector:
 
     def combine_csv_files(self):
         csv_combiner = CSVCombiner(self.output_name_csv, self.behavior_analyzer.output_name_csv,
-                                   self.behavior_analyzer.shift)
+                                   self.behavior_analyzer.shift, self.export_format)
 
-        csv_combiner.combine()
+        self.session_data = csv_combiner.combine()
+        self.path_to_session_data = csv_combiner.path_to_session_data
+        self.path_to_bouts = csv_combiner.path_to_bouts
+        self.bouts = csv_combiner.bouts
+        self.bout_stats = summarize_bouts(self.bouts, list(self.behavior_analyzer.model.names.values()))
 
     def plot_graphs(self):
-        plotter = Plotter(self.behavior_analyzer.output_name_csv, self.radius_arena)
-        plotter.plot()
+        plotter = Plotter(self.behavior_analyzer.output_name_csv, self.radius_arena, self.plot_profile,
+                          self.plot_vector_formats, self.plot_workers, df=self.session_data, bouts=self.bouts,
+                          do_decimate=self.do_decimate_plots)
+        self.plot_report = plotter.plot()
 
     def export_to_csv(self, row_data: list):
-        with open(f'{self.output_name_csv}.csv', 'a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(row_data)
+        with self.profiler.measure('csv io'):
+            self.csv_writer.writerow(row_data)
+
+    def get_raw_cache_meta(self, info_arena, fps) -> dict:
+        return {
+            'video': self.path_to_video,
+            'name': os.path.basename(self.path_to_video).split('.')[0],
+            'fps': fps,
+            'frames': self.keypoint_store.count_frames,
+            'info_arena': info_arena,
+            'behaviors': list(self.behavior_analyzer.model.names.values()),
+            'shift': self.behavior_analyzer.shift,
+            'backend': self.backend,
+            'pose_weights': get_weights_id(self.path_to_weight_yolo),
+            'behavior_weights': get_weights_id(self.path_to_behavior_weight_yolo),
+            'settings': self.get_checkpoint_settings()
+        }
 
-    def draw(self, frame: np.ndarray, info_mouse: dict, info_arena: dict) -> np.ndarray:
-        frame = cv2.circle(frame, (info_arena['x_center'], info_arena['y_center']), 2, (0, 0, 255), -1)
-        frame = cv2.circle(frame, (info_arena['x_center'], info_arena['y_center']), info_arena['central_zone'][1], (0, 0, 255), 2)
-        frame = cv2.circle(frame, (info_arena['x_center'], info_arena['y_center']), info_arena['internal_zone'][1], (0, 255, 0), 2)
-        frame = cv2.circle(frame, (info_arena['x_center'], info_arena['y_center']), info_arena['middle_zone'][1], (255, 0, 0), 2)
-        frame = cv2.circle(frame, (info_arena['x_center'], info_arena['y_center']), info_arena['outer_zone'][1], (255, 0, 255), 2)
+    # The behavior rows are read back from the closed csv, so a resumed run caches the rows of both parts
+    def save_raw_cache(self, info_arena, fps):
+        name = os.path.basename(self.path_to_video).split('.')[0]
+        state = self.keypoint_store.get_state()
+        RawCache(get_path_raw_cache(name)).save_from_csv(
+            state['keypoints'], state['found'], f'{self.behavior_analyzer.output_name_csv}.csv',
+            self.get_raw_cache_meta(info_arena, fps))
+
+    # Checkpoints are made after the batch with a frame number that is a multiple of the interval,
+    # so a resumed run splits the rest of the video into the same batches
+    def is_checkpoint_batch(self, batch) -> bool:
+        if self.checkpoint_interval is None:
+            return False
+        return batch[-1][0] // self.checkpoint_interval > (batch[0][0] - 1) // self.checkpoint_interval
+
+    def get_path_checkpoint(self):
+        name = os.path.basename(self.path_to_video).split('.')[0]
+        return os.path.join('mouse_data', f'{name}_checkpoint.npz')
+
+    def get_checkpoint_settings(self) -> dict:
+        return {
+            'video': os.path.basename(self.path_to_video),
+            'video_frames': self.count_video_frames,
+            'batch_size': self.batch_size,
+            'behavior_stride': self.behavior_stride,
+            'behavior_interpolation': self.behavior_interpolation,
+            'downscale_behavior_buffer': self.do_downscale_behavior_buffer,
+            'arena_roi': [self.do_arena_roi, self.roi_margin, self.roi_max_size],
+            'tracking': self.tracker is not None
+        }
 
-        if self.is_mouse_found(info_mouse):
-            frame = cv2.line(frame, (info_mouse['point_nose'][0], info_mouse['point_nose'][1]), (info_mouse['point_r_ear'][0], info_mouse['point_r_ear'][1]), (0, 255, 255), 2)
-            frame = cv2.line(frame, (info_mouse['point_nose'][0], info_mouse['point_nose'][1]), (info_mouse['point_l_ear'][0], info_mouse['point_l_ear'][1]), (0, 255, 255), 2)
-            frame = cv2.line(frame, (info_mouse['point_r_ear'][0], info_mouse['point_r_ear'][1]), (info_mouse['point_near'][0], info_mouse['point_near'][1]), (0, 255, 255), 2)
-            frame = cv2.line(frame, (info_mouse['point_l_ear'][0], info_mouse['point_l_ear'][1]), (info_mouse['point_near'][0], info_mouse['point_near'][1]), (0, 255, 255), 2)
-            frame = cv2.line(frame, (info_mouse['point_near'][0], info_mouse['point_near'][1]), (info_mouse['point_r_side'][0], info_mouse['point_r_side'][1]), (0, 255, 255), 2)
-            frame = cv2.line(frame, (info_mouse['point_near'][0], info_mouse['point_near'][1]), (info_mouse['point_l_side'][0], info_mouse['point_l_side'][1]), (0, 255, 255), 2)
-            frame = cv2.line(frame, (info_mouse['point_l_side'][0], info_mouse['point_l_side'][1]), (info_mouse['point_tail'][0], info_mouse['point_tail'][1]), (0, 255, 255), 2)
-            frame = cv2.line(frame, (info_mouse['point_r_side'][0], info_mouse['point_r_side'][1]), (info_mouse['point_tail'][0], info_mouse['point_tail'][1]), (0, 255, 255), 2)
-
-            frame = cv2.circle(frame, (info_mouse['point_nose'][0], info_mouse['point_nose'][1]), 3, (0, 0, 255), -1)
-            frame = cv2.circle(frame, (info_mouse['point_r_ear'][0], info_mouse['point_r_ear'][1]), 3, (0, 255, 0), -1)
-            frame = cv2.circle(frame, (info_mouse['point_l_ear'][0], info_mouse['point_l_ear'][1]), 3, (0, 255, 0), -1)
-            frame = cv2.circle(frame, (info_mouse['point_near'][0], info_mouse['point_near'][1]), 3, (0, 0, 255), -1)
-            frame = cv2.circle(frame, (info_mouse['point_r_side'][0], info_mouse['point_r_side'][1]), 3, (255, 0, 0), -1)
-            frame = cv2.circle(frame, (info_mouse['point_l_side'][0], info_mouse['point_l_side'][1]), 3, (255, 0, 0), -1)
-            frame = cv2.circle(frame, (info_mouse['point_tail'][0], info_mouse['point_tail'][1]), 3, (0, 0, 255), -1)
-
-        return frame
+    def save_checkpoint(self, frame_number: int):
+        state = {
+            'settings': self.get_checkpoint_settings(),
+            'frame_count': frame_number,
+            'info_arena': self.info_arena,
+            'csv_offsets': self.csv_session.get_offsets(),
+            'keypoint_store': self.keypoint_store.get_state(),
+            'behavior': self.behavior_analyzer.get_state(),
+            'tracker': self.tracker_states.pop(frame_number) if self.tracker is not None else None
+        }
+        self.checkpoint_store.save(state)
+
+    def load_checkpoint(self):
+        checkpoint = self.checkpoint_store.load()
+        if checkpoint is None:
+            print(f'[WARNING]: No checkpoint {self.checkpoint_store.path}, the video is processed from the start')
+            return None
+        settings = self.get_checkpoint_settings()
+        if checkpoint['settings'] != settings:
+            raise ValueError(f"[ERROR]: Checkpoint settings {checkpoint['settings']} do not match {settings}")
+        return checkpoint
+
+    def restore_checkpoint(self) -> dict:
+        _, self.reference_frame = self.input_video.read()
+        self.keypoint_store.set_state(self.checkpoint['keypoint_store'])
+        self.behavior_analyzer.set_state(self.checkpoint['behavior'])
+        if self.tracker is not None:
+            self.tracker.set_state(self.checkpoint['tracker'])
+
+        self.frame_count = self.checkpoint['frame_count']
+        self.skip_to_frame(COUNT_FRAMES_BEFORE_PROCESSING + self.frame_count)
+        print(f'Resuming {self.path_to_video} after frame {self.frame_count}')
+
+        info_arena = self.checkpoint['info_arena']
+        self.radius_arena = info_arena['radius_arena']
+        return {key: tuple(value) if isinstance(value, list) else value for key, value in info_arena.items()}
+
+    # CAP_PROP_POS_FRAMES is not frame-accurate for every H264/MP4 file, and a seek that lands one frame off
+    # shifts the frame numbers, the times and the speeds of the rest of the run. So the frames are grabbed one
+    # by one by default; the fast seek is used only on request and only when the position reads back exactly
+    def skip_to_frame(self, target: int):
+        if self.do_fast_resume_seek:
+            if self.input_video.set(cv2.CAP_PROP_POS_FRAMES, target) and \
+                    int(self.input_video.get(cv2.CAP_PROP_POS_FRAMES)) == target:
+                return
+            print(f'[WARNING]: Seek to frame {target} is not exact, grabbing the frames from the start')
+            self.input_video.release()
+            self.input_video = cv2.VideoCapture(self.path_to_video)
+
+        position = int(self.input_video.get(cv2.CAP_PROP_POS_FRAMES))
+        for _ in range(target - position):
+            if not self.input_video.grab():
+                raise ValueError(f"[ERROR]: Couldn't reach frame {target} of {self.path_to_video} to resume")
+
+    def get_path_run_report(self):
+        name = os.path.basename(self.path_to_video).split('.')[0]
+        return os.path.join('mouse_data', f'{name}_report.json')
+
+    def save_run_report(self):
+        extra = {
+            'video': self.path_to_video,
+            'frames': self.frame_count,
+            'batch_size': self.batch_size,
+            'backend': self.backend,
+            'behavior_stride': self.behavior_stride,
+            'pipeline': self.pipeline_report,
+            'arena_detection': {'fast': self.do_fast_arena_detection, 'frames': self.arena_frames,
+                                'calibration': self.arena_calibration.report()
+                                if self.arena_calibration is not None else None},
+            'arena_roi': self.roi_report,
+            'tracking': self.get_tracking_report() if self.tracker is not None else None,
+            'checkpoint': {'interval': self.checkpoint_interval, 'resumed_from_frame': self.resumed_from_frame},
+            'session_data': self.path_to_session_data,
+            'bouts': {'path': self.path_to_bouts,
+                      'stats': self.bout_stats.to_dict(orient='index') if self.bout_stats is not None else None},
+            'plots': self.plot_report,
+            'output_video': self.output_video.report() if self.do_output_video else None,
+            'raw_cache': get_path_raw_cache(os.path.basename(self.path_to_video).split('.')[0])
+            if self.do_raw_cache else None
+        }
+        self.run_report = self.profiler.save(self.get_path_run_report(), extra)
+        print(f'Run report: {self.get_path_run_report()}')
+        self.profiler.print_report()
 
 
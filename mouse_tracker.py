@@ -0,0 +1,92 @@
+import numpy as np
+
+from crop_window import CropWindow
+from keypoint_store import KEYPOINT_NAMES
+
+DEFAULT_MIN_WINDOW_SIZE = 256
+DEFAULT_MIN_CONFIDENCE = 0.5
+WINDOW_MARGIN = 0.5
+
+
+class MouseTracker:
+    def __init__(self, min_window_size: int = DEFAULT_MIN_WINDOW_SIZE, min_confidence: float = DEFAULT_MIN_CONFIDENCE):
+        self.min_window_size = min_window_size
+        self.min_confidence = min_confidence
+
+        self.keypoints = None
+        self.velocity = np.zeros(2)
+
+        self.count_frames = 0
+        self.count_window_searches = 0
+        self.count_fallbacks = 0
+        self.count_full_searches = 0
+
+    # The window is centered on the previous keypoints moved by the last velocity, and it grows
+    # with the number of frames since the last update, because batched frames are predicted together
+    def predict_window(self, frame_shape: tuple, frames_ahead: int = 1):
+        if self.keypoints is None:
+            return None
+
+        shift = self.velocity * frames_ahead
+        point_min = self.keypoints.min(axis=0) + shift
+        point_max = self.keypoints.max(axis=0) + shift
+        center = (point_min + point_max) / 2
+        side = max((point_max - point_min).max() * (1 + 2 * WINDOW_MARGIN) + 2 * np.abs(shift).max(),
+                   self.min_window_size)
+
+        try:
+            return CropWindow(center[0] - side / 2, center[1] - side / 2, center[0] + side / 2, center[1] + side / 2,
+                              frame_shape)
+        except ValueError:
+            return None
+
+    def is_confident(self, confidence: float) -> bool:
+        return confidence >= self.min_confidence
+
+    def update(self, info_mouse: dict, had_window: bool, is_fallback: bool):
+        self.count_frames += 1
+        if had_window:
+            self.count_window_searches += 1
+        if is_fallback:
+            self.count_fallbacks += 1
+        if not had_window or is_fallback:
+            self.count_full_searches += 1
+
+        if not info_mouse:
+            self.keypoints = None
+            self.velocity = np.zeros(2)
+            return
+
+        keypoints = np.array([info_mouse[name] for name in KEYPOINT_NAMES], dtype=np.float64)
+        if self.keypoints is not None:
+            self.velocity = keypoints.mean(axis=0) - self.keypoints.mean(axis=0)
+        self.keypoints = keypoints
+
+    def get_state(self) -> dict:
+        return {
+            'keypoints': self.keypoints.copy() if self.keypoints is not None else None,
+            'velocity': self.velocity.copy(),
+            'count_frames': self.count_frames,
+            'count_window_searches': self.count_window_searches,
+            'count_fallbacks': self.count_fallbacks,
+            'count_full_searches': self.count_full_searches
+        }
+
+    def set_state(self, state: dict):
+        self.keypoints = state['keypoints']
+        self.velocity = state['velocity']
+        self.count_frames = state['count_frames']
+        self.count_window_searches = state['count_window_searches']
+        self.count_fallbacks = state['count_fallbacks']
+        self.count_full_searches = state['count_full_searches']
+
+    def report(self) -> dict:
+        return {
+            'frames': self.count_frames,
+            'window_searches': self.count_window_searches,
+            'fallbacks': self.count_fallbacks,
+            'full_searches': self.count_full_searches,
+            'fallback_rate': round(self.count_fallbacks / self.count_window_searches, 4)
+            if self.count_window_searches else 0.0,
+            'full_search_rate': round(self.count_full_searches / self.count_frames, 4) if self.count_frames else 0.0
+        }
@@ -1,38 +1,170 @@
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+import multiprocessing
 import os
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
 
 from scipy.ndimage import gaussian_filter
 from scipy.signal import savgol_filter
 
 from calculator_speed import RADUIS_ARENA_IN_METERS
+from bouts import encode_bouts, load_bouts, summarize_bouts
+from csv_combiner import TIME_COLUMN, TIME_SECONDS_COLUMN, parse_times
+from decimation import lttb, rasterize_labels, MAX_LINE_POINTS, SCATTER_RASTER_BINS
+from matplotlib.colors import to_rgba
+from matplotlib.ticker import FuncFormatter
+from session_export import get_export_format, load_session_data, read_session_data
 
 ZONES_ARENA = ["Central zone", "Internal zone", "Middle zone", "Outer zone"]
 BEHAVIORS = ['groom', 'run', 'sit']
 BEHAVIORS_PALETTE = {'groom': 'blue', 'run': 'green', 'sit': 'red'}
-STEP_TIME_FOR_ETHOGRAM = 30
+ETHOGRAM_BAR_HEIGHT = 0.8
+PLOT_NAMES = ('trajectory', 'speed', 'position_heatmap', 'velocity_heatmap', 'hist_zones', 'behs_on_trajectory',
+              'ethogram', 'bout_stats')
+PLOT_PROFILES = {
+    'preview': {'dpi': 100},
+    'standard': {'dpi': 300},
+    'publication': {'dpi': 1000}
+}
+DEFAULT_PLOT_PROFILE = 'publication'
+# Every worker is a spawned interpreter with its own pickled copy of the session table
+DEFAULT_PLOT_WORKERS = 2
+VECTOR_FORMATS = ('svg', 'pdf')
+
+
+# Peak resident memory of the process. On Linux it is VmHWM, which clear_refs resets before every plot;
+# elsewhere ru_maxrss (bytes on macOS) or the peak working set of psutil on Windows, which only grow
+def reset_peak_memory():
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+
+def get_peak_memory_mb() -> float:
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        import psutil
+        memory_info = psutil.Process().memory_info()
+        return getattr(memory_info, 'peak_wset', memory_info.rss) / 2 ** 20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+worker_plotter = None
+
+
+# Every worker process gets the session table once and renders the plots it is given
+def init_plot_worker(path_to_beh, radius_arena, profile, vector_formats, df, bouts, do_decimate):
+    global worker_plotter
+    plt.switch_backend('Agg')
+    worker_plotter = Plotter(path_to_beh, radius_arena, profile, vector_formats, max_workers=1, df=df, bouts=bouts,
+                             do_decimate=do_decimate)
+
+
+def render_plot(name) -> dict:
+    return worker_plotter.render(name)
+
 
 class Plotter:
-    def __init__(self, path_to_beh, radius_arena):
+    # The combined session table and its bouts are taken as they are; without them the saved artifacts of the
+    # session are loaded. Bouts are encoded here only for sessions saved before they were
+    # With do_decimate the lines are drawn through LTTB-selected points and the behavior scatter as a raster,
+    # so the cost of a plot does not grow with the length of the session
+    def __init__(self, path_to_beh, radius_arena, profile=DEFAULT_PLOT_PROFILE, vector_formats=(), max_workers=None,
+                 df=None, bouts=None, do_decimate=False):
+        if profile not in PLOT_PROFILES:
+            raise ValueError(f"[ERROR]: Unknown plot profile {profile}, expected one of {tuple(PLOT_PROFILES)}")
+        for vector_format in vector_formats:
+            if vector_format not in VECTOR_FORMATS:
+                raise ValueError(f"[ERROR]: Unknown vector format {vector_format}, expected one of {VECTOR_FORMATS}")
+
+        self.path_to_beh = path_to_beh
         self.video_name = f'{path_to_beh[:len(path_to_beh) - 4]}'
-        self.path_to_data = f'mouse_data\\{self.video_name}_data.xlsx'
-        self.path_to_plots = f'mouse_data\\{self.video_name}_plots'
+        self.path_to_plots = os.path.join('mouse_data', f'{self.video_name}_plots')
         os.makedirs(self.path_to_plots, exist_ok=True)
-        self.df = pd.read_excel(self.path_to_data)
+        self.df = df if df is not None else load_session_data(self.video_name)
+        # Artifacts saved before the typed time column was added
+        if TIME_SECONDS_COLUMN not in self.df:
+            self.df = self.df.assign(**{TIME_SECONDS_COLUMN: parse_times(self.df[TIME_COLUMN])})
         self.radius_arena = radius_arena
         self.meters_in_px = RADUIS_ARENA_IN_METERS / self.radius_arena
-
-
-    def plot(self):
-        self.plot_trajectory()
-        self.plot_speed()
-        self.plot_position_heatmap()
-        self.plot_velocity_heatmap()
-        self.plot_hist_zones()
-        self.plot_behs_on_trajectory()
-        self.plot_ethogram()
+        self.profile = profile
+        self.vector_formats = tuple(vector_formats)
+        self.do_decimate = do_decimate
+        if bouts is None and df is None:
+            bouts = load_bouts(self.video_name)
+        self.bouts = bouts if bouts is not None else encode_bouts(self.df[BEHAVIORS], self.df[TIME_SECONDS_COLUMN])
+        self.max_workers = max_workers if max_workers is not None else min(DEFAULT_PLOT_WORKERS, os.cpu_count() or 1)
+        self.report = None
+
+    # Re-plotting from a saved table, e.g. mouse_data/test114_1_data.parquet
+    @classmethod
+    def from_artifact(cls, path_to_session_data, radius_arena, **kwargs):
+        name = os.path.basename(path_to_session_data)
+        name = name[:name.rindex('_data.')]
+        export_format = get_export_format(path_to_session_data)
+        df = read_session_data(path_to_session_data, export_format)
+        path_to_bouts = path_to_session_data[:path_to_session_data.rindex('_data.')] + f'_bouts.{export_format}'
+        bouts = read_session_data(path_to_bouts, export_format) if os.path.exists(path_to_bouts) else None
+        return cls(f'{name}_beh', radius_arena, df=df, bouts=bouts, **kwargs)
+
+    # The plots are shared between the worker processes; with one worker they are rendered here one by one
+    def plot(self) -> dict:
+        start = time.perf_counter()
+        if self.max_workers <= 1:
+            report = {name: self.render(name) for name in PLOT_NAMES}
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=init_plot_worker,
+                                     initargs=(self.path_to_beh, self.radius_arena, self.profile,
+                                               self.vector_formats, self.df, self.bouts,
+                                               self.do_decimate)) as executor:
+                futures = {name: executor.submit(render_plot, name) for name in PLOT_NAMES}
+                report = {name: future.result() for name, future in futures.items()}
+
+        self.report = {'profile': self.profile, 'workers': self.max_workers, 'decimate': self.do_decimate,
+                       'wall_time_s': round(time.perf_counter() - start, 3), 'plots': report}
+        self.print_report()
+        return self.report
+
+    def render(self, name) -> dict:
+        reset_peak_memory()
+        start = time.perf_counter()
+        files = getattr(self, f'plot_{name}')()
+        return {'time_s': round(time.perf_counter() - start, 3), 'peak_memory_mb': round(get_peak_memory_mb(), 1),
+                'files': files}
+
+    def print_report(self):
+        print(f'Plots ({self.report["profile"]}, {self.report["workers"]} workers): '
+              f'{self.report["wall_time_s"]:.2f} s')
+        for name, stats in self.report['plots'].items():
+            print(f'  {name:<20} time: {stats["time_s"]:>7.2f} s  peak memory: {stats["peak_memory_mb"]:>8.1f} MB')
+
+    # The figure is closed once it is saved, so the memory of its canvas is released
+    def save_figure(self, filename) -> list:
+        figure = plt.gcf()
+        files = [filename]
+        figure.savefig(filename, bbox_inches='tight', dpi=PLOT_PROFILES[self.profile]['dpi'])
+        for vector_format in self.vector_formats:
+            path = f'{os.path.splitext(filename)[0]}.{vector_format}'
+            figure.savefig(path, bbox_inches='tight')
+            files.append(path)
+        plt.close(figure)
+        return files
 
     def plot_trajectory(self):
         start_x, start_y = self.df['X, px'].iloc[0], self.df['Y, px'].iloc[0]
@@ -40,7 +172,11 @@ class Plotter:
 
         plt.figure(figsize=(10, 10))
 
-        plt.plot(self.df['X, px'], self.df['Y, px'], color='darkorange')
+        x, y = self.df['X, px'].to_numpy(), self.df['Y, px'].to_numpy()
+        if self.do_decimate:
+            indices = lttb(np.column_stack([x, y]), MAX_LINE_POINTS)
+            x, y = x[indices], y[indices]
+        plt.plot(x, y, color='darkorange')
 
         circle = plt.Circle((0, 0), self.radius_arena, color='black', fill=False, linestyle='--', linewidth=1.5)
         plt.gca().add_artist(circle)
@@ -67,7 +203,7 @@ class Plotter:
         plt.ylabel("Y (m)")
         plt.legend()
         filename = os.path.join(self.path_to_plots, f'trajectory_{self.video_name}.png')
-        plt.savefig(filename, bbox_inches='tight', dpi=1000)
+        return self.save_figure(filename)
 
 
     def plot_speed(self):
@@ -80,18 +216,25 @@ class Plotter:
         window_length = 91
         polyorder = 4
 
-        self.df['Smoothed Speed (Savitzky-Golay)'] = savgol_filter(self.df['Speed, m/s'], window_length, polyorder)
+        speed = self.df['Speed, m/s'].to_numpy()
+        smoothed_speed = savgol_filter(speed, window_length, polyorder)
+        # The rows are drawn at their positions, as the unique time labels of a categorical axis are
+        positions = np.arange(len(self.df))
+        indices = lttb(np.column_stack([positions, speed]), MAX_LINE_POINTS) if self.do_decimate else positions
+        indices_smoothed = lttb(np.column_stack([positions, smoothed_speed]), MAX_LINE_POINTS) \
+            if self.do_decimate else positions
 
         plt.figure(figsize=(10, 5))
-        plt.plot(self.df['Time, m:s'], self.df['Speed, m/s'], color='green', alpha=0.3, label="Original Speed")
-        plt.plot(self.df['Time, m:s'], self.df['Smoothed Speed (Savitzky-Golay)'], color='red', label="Smoothed Speed (Savitzky-Golay)")
+        plt.plot(indices, speed[indices], color='green', alpha=0.3, label="Original Speed")
+        plt.plot(indices_smoothed, smoothed_speed[indices_smoothed], color='red',
+                 label="Smoothed Speed (Savitzky-Golay)")
         plt.xticks(ticks=tick_positions, labels=tick_labels, rotation=45, ha='right')  # Повернем для лучшей читаемости
         plt.title("Speed over Time (Smoothed with Savitzky-Golay)")
         plt.xlabel("Time, m:s")
         plt.ylabel("Speed, m/s")
         plt.legend()
         filename = os.path.join(self.path_to_plots, f'speed_{self.video_name}.png')
-        plt.savefig(filename, bbox_inches='tight', dpi=1000)
+        return self.save_figure(filename)
 
     def plot_position_heatmap(self):
         x = self.df['X, px']
@@ -131,7 +274,7 @@ class Plotter:
         plt.ylabel("Y (px)")
 
         filename = os.path.join(self.path_to_plots, f'position_heatmap_log_{self.video_name}.png')
-        plt.savefig(filename, bbox_inches='tight', dpi=1000)
+        return self.save_figure(filename)
 
 
     def plot_velocity_heatmap(self):
@@ -174,19 +317,12 @@ class Plotter:
         plt.xlabel("X (m)")
         plt.ylabel("Y (m)")
         filename = os.path.join(self.path_to_plots, f'position_average_speed_{self.video_name}.png')
-        plt.savefig(filename, bbox_inches='tight', dpi=1000)
+        return self.save_figure(filename)
 
     def plot_hist_zones(self):
-        def time_to_seconds(time_str):
-            minutes, rest = time_str.split(':')
-            seconds, milliseconds = rest.split(',')
-            return int(minutes) * 60 + int(seconds) + int(milliseconds) / 100
-
-        self.df["Time (s)"] = self.df["Time, m:s"].apply(time_to_seconds)
+        time_differences = self.df[TIME_SECONDS_COLUMN].diff().fillna(0)
 
-        self.df["Time Difference (s)"] = self.df["Time (s)"].diff().fillna(0)
-
-        zone_times = (self.df[ZONES_ARENA].multiply(self.df["Time Difference (s)"], axis=0)).sum()
+        zone_times = (self.df[ZONES_ARENA].multiply(time_differences, axis=0)).sum()
 
         plt.figure(figsize=(12, 5))
 
@@ -205,7 +341,7 @@ class Plotter:
         plt.ylabel("Percentage of time (%)")
         plt.xticks(rotation=360)
         filename = os.path.join(self.path_to_plots, f'histogram_for_zones_{self.video_name}.png')
-        plt.savefig(filename, bbox_inches='tight', dpi=1000)
+        return self.save_figure(filename)
 
     def plot_behs_on_trajectory(self):
         filtered_df = self.df[self.df[BEHAVIORS].sum(axis=1) > 0]
@@ -214,7 +350,10 @@ class Plotter:
         circle = plt.Circle((0, 0), self.radius_arena, color='gray', fill=False, linestyle='--', linewidth=2)
         plt.gca().add_artist(circle)
 
-        sns.scatterplot(x='X, px', y='Y, px', hue=filtered_df[BEHAVIORS].idxmax(axis=1), data=filtered_df, s=25, palette=BEHAVIORS_PALETTE)
+        if self.do_decimate:
+            self.draw_behaviors_raster(filtered_df)
+        else:
+            sns.scatterplot(x='X, px', y='Y, px', hue=filtered_df[BEHAVIORS].idxmax(axis=1), data=filtered_df, s=25, palette=BEHAVIORS_PALETTE)
         plt.scatter(0, 0, color='black', edgecolor='black', s=75, zorder=5, label="center")
 
         plt.xlim(-self.radius_arena, self.radius_arena)
@@ -235,19 +374,59 @@ class Plotter:
         plt.xlabel("X, m")
         plt.ylabel("Y, m")
         filename = os.path.join(self.path_to_plots, f'behaviors_on_trajectory_{self.video_name}.png')
-        plt.savefig(filename, bbox_inches='tight', dpi=1000)
-
+        return self.save_figure(filename)
+
+    # Every raster cell is about the size of a scatter marker and takes the color of its most frequent behavior
+    def draw_behaviors_raster(self, filtered_df):
+        labels = filtered_df[BEHAVIORS].to_numpy(dtype=np.float64).argmax(axis=1)
+        colors = np.array([to_rgba(BEHAVIORS_PALETTE[behavior]) for behavior in BEHAVIORS])
+        extent = (-self.radius_arena, self.radius_arena, -self.radius_arena, self.radius_arena)
+        image = rasterize_labels(filtered_df['X, px'].to_numpy(), filtered_df['Y, px'].to_numpy(), labels, colors,
+                                 extent, SCATTER_RASTER_BINS)
+        plt.imshow(image, extent=extent, origin='lower', interpolation='nearest', zorder=2)
+        for behavior in BEHAVIORS:
+            plt.scatter([], [], color=BEHAVIORS_PALETTE[behavior], s=25, label=behavior)
+
+    # One bar per bout, so the cost depends on the count of bouts and not on the count of frames
     def plot_ethogram(self):
-        trimmed_df = self.df[BEHAVIORS].iloc[10:-10]
-
-        time_labels = self.df["Time, m:s"].iloc[10:-10:STEP_TIME_FOR_ETHOGRAM]
-        time_indices = range(0, len(trimmed_df), STEP_TIME_FOR_ETHOGRAM)
-
         plt.figure(figsize=(10, 5))
-        sns.heatmap(trimmed_df.astype(int).T, cbar=False, cmap="viridis")
+        for index, behavior in enumerate(BEHAVIORS):
+            bouts = self.bouts[self.bouts['Behavior'] == behavior]
+            plt.broken_barh(list(zip(bouts['Start, s'], bouts['Duration, s'])),
+                            (index - ETHOGRAM_BAR_HEIGHT / 2, ETHOGRAM_BAR_HEIGHT),
+                            facecolors=BEHAVIORS_PALETTE[behavior])
+        plt.yticks(range(len(BEHAVIORS)), BEHAVIORS)
+        plt.ylim(len(BEHAVIORS) - 0.5, -0.5)
+        plt.xlim(self.df[TIME_SECONDS_COLUMN].iloc[0], self.df[TIME_SECONDS_COLUMN].iloc[-1])
+        plt.gca().xaxis.set_major_formatter(
+            FuncFormatter(lambda seconds, _: f'{int(seconds // 60):02d}:{int(seconds % 60):02d}'))
         plt.title("Ethogram")
-        plt.xlabel("Time")
-        plt.xticks(ticks=time_indices, labels=time_labels, rotation=60)
+        plt.xlabel("Time, m:s")
+        plt.xticks(rotation=60)
         filename = os.path.join(self.path_to_plots, f'ethogram_{self.video_name}.png')
-        plt.savefig(filename, bbox_inches='tight', dpi=1000)
+        return self.save_figure(filename)
+
+    def plot_bout_stats(self):
+        stats = summarize_bouts(self.bouts, BEHAVIORS)
+        colors = [BEHAVIORS_PALETTE[behavior] for behavior in BEHAVIORS]
+
+        plt.figure(figsize=(12, 5))
+
+        plt.subplot(1, 2, 1)
+        stats['Total, s'].plot(kind='bar', color=colors, edgecolor='black')
+        plt.title("Time spent in the behaviors (s)")
+        plt.xlabel("Behaviors")
+        plt.ylabel("Time (s)")
+        plt.xticks(rotation=360)
+
+        plt.subplot(1, 2, 2)
+        stats['Mean, s'].plot(kind='bar', color=colors, edgecolor='black')
+        for index, (count, mean) in enumerate(zip(stats['Bouts'], stats['Mean, s'].fillna(0))):
+            plt.annotate(f'n={count}', (index, mean), xytext=(0, 3), textcoords='offset points', ha='center')
+        plt.title("Mean duration of a bout (s)")
+        plt.xlabel("Behaviors")
+        plt.ylabel("Duration (s)")
+        plt.xticks(rotation=360)
+        filename = os.path.join(self.path_to_plots, f'bout_stats_{self.video_name}.png')
+        return self.save_figure(filename)
 
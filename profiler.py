@@ -0,0 +1,78 @@
+import array
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class StageStats:
+    def __init__(self):
+        self.durations = array.array('d')
+        self.count_frames = 0
+
+
+# Every measurement costs two perf_counter calls and an append to a typed array, so it can stay on in production
+class Profiler:
+    def __init__(self):
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+
+    def get_stage(self, name: str) -> StageStats:
+        stage = self.stages.get(name)
+        if stage is None:
+            with self.lock:
+                stage = self.stages.setdefault(name, StageStats())
+        return stage
+
+    def add(self, name: str, duration: float, count_frames: int = 1):
+        stage = self.get_stage(name)
+        stage.durations.append(duration)
+        stage.count_frames += count_frames
+
+    @contextmanager
+    def measure(self, name: str, count_frames: int = 1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, count_frames)
+
+    def report(self) -> dict:
+        report = {}
+        for name, stage in list(self.stages.items()):
+            durations = np.frombuffer(stage.durations, dtype=np.float64) if len(stage.durations) else np.zeros(1)
+            total = float(durations.sum())
+            report[name] = {
+                'count': len(stage.durations),
+                'frames': stage.count_frames,
+                'total_s': round(total, 4),
+                'mean_ms': round(float(durations.mean()) * 1000, 3),
+                'p95_ms': round(float(np.percentile(durations, 95)) * 1000, 3),
+                'fps': round(stage.count_frames / total, 2) if total > 0 else None
+            }
+        return report
+
+    def save(self, path: str, extra: dict = None) -> dict:
+        report = {
+            'wall_time_s': round(time.perf_counter() - self.start_time, 3),
+            'stages': self.report()
+        }
+        if extra:
+            report.update(extra)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=4, ensure_ascii=False)
+        return report
+
+    def print_report(self):
+        for name, stats in self.report().items():
+            fps = f'{stats["fps"]:>9.1f}' if stats['fps'] is not None else f'{"-":>9}'
+            print(f'  {name:<20} count: {stats["count"]:>7}  total: {stats["total_s"]:>9.2f} s  '
+                  f'mean: {stats["mean_ms"]:>8.2f} ms  p95: {stats["p95_ms"]:>8.2f} ms  frames/s: {fps}')
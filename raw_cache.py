@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+PROBS_SCALE = 1000
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def get_path_raw_cache(name: str) -> str:
+    return os.path.join('mouse_data', f'{name}_raw')
+
+
+def get_weights_id(path: str) -> dict:
+    if not os.path.exists(path):
+        return {'path': path, 'size': None, 'sha256': None}
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return {'path': path, 'size': os.path.getsize(path), 'sha256': sha256.hexdigest()}
+
+
+# Keypoints of every frame with the found mask, and the behavior rows exactly as in the _beh csv:
+# the probabilities are rounded to 3 decimals there, so they are kept as integers in thousandths
+class RawCache:
+    def __init__(self, path: str):
+        self.path = path
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.path, 'meta.json'))
+
+    def save(self, keypoints: np.ndarray, found: np.ndarray, probs: np.ndarray, meta: dict):
+        os.makedirs(self.path, exist_ok=True)
+        np.save(os.path.join(self.path, 'keypoints.npy'), keypoints.astype(np.int32))
+        np.save(os.path.join(self.path, 'found.npy'), found.astype(bool))
+        np.save(os.path.join(self.path, 'probs.npy'), np.round(probs * PROBS_SCALE).astype(np.uint16))
+        meta = dict(meta, created=time.strftime('%Y-%m-%d %H:%M:%S'))
+        # meta.json is written last, so a cache without it is incomplete
+        with open(os.path.join(self.path, 'meta.json'), 'w') as file:
+            json.dump(meta, file, indent=4, ensure_ascii=False)
+
+    def save_from_csv(self, keypoints: np.ndarray, found: np.ndarray, path_to_behavior_csv: str, meta: dict):
+        probs = pd.read_csv(path_to_behavior_csv).to_numpy(dtype=np.float64)
+        self.save(keypoints, found, probs.reshape(len(probs), -1), meta)
+
+    def load_meta(self) -> dict:
+        if not self.exists():
+            raise ValueError(f"[ERROR]: No raw cache in {self.path}")
+        with open(os.path.join(self.path, 'meta.json')) as file:
+            return json.load(file)
+
+    def load_keypoints(self) -> tuple[np.ndarray, np.ndarray]:
+        keypoints = np.load(os.path.join(self.path, 'keypoints.npy'), mmap_mode='r')
+        found = np.load(os.path.join(self.path, 'found.npy'), mmap_mode='r')
+        return keypoints, found
+
+    def load_probs(self) -> np.ndarray:
+        return np.load(os.path.join(self.path, 'probs.npy'), mmap_mode='r') / PROBS_SCALE
@@ -0,0 +1,84 @@
+import argparse
+import os
+
+import numpy as np
+
+from analytic_image_processor import build_info_arena
+from csv_combiner import CSVCombiner, BLOCK_SIZE
+from csv_writer import CSVWriterSession
+from plotter import Plotter, PLOT_PROFILES, DEFAULT_PLOT_PROFILE, VECTOR_FORMATS
+from profiler import Profiler
+from raw_cache import RawCache, get_path_raw_cache
+from session_analytics import SessionAnalytics, STATIC_CSV_HEADER
+from session_export import EXPORT_FORMATS, DEFAULT_EXPORT_FORMAT
+
+
+def get_info_arena(meta: dict, radius_arena: int = None, central_radius: int = None) -> dict:
+    info_arena = meta['info_arena']
+    return build_info_arena(info_arena['x_center'], info_arena['y_center'],
+                            radius_arena if radius_arena is not None else info_arena['radius_arena'],
+                            central_radius if central_radius is not None else info_arena['central_zone'][1])
+
+
+# Rebuilds the _static and _beh csv, the combined table and the plots from the raw cache,
+# without the video and the models
+def reanalyze(name: str, radius_arena: int = None, central_radius: int = None, do_plot_graphs: bool = True,
+              profiler: Profiler = None, export_format: str = DEFAULT_EXPORT_FORMAT,
+              block_size: int = BLOCK_SIZE, plot_profile: str = DEFAULT_PLOT_PROFILE,
+              plot_vector_formats: tuple = (), plot_workers: int = None,
+              do_decimate_plots: bool = False) -> Profiler:
+    profiler = profiler if profiler is not None else Profiler()
+    cache = RawCache(get_path_raw_cache(name))
+    meta = cache.load_meta()
+    info_arena = get_info_arena(meta, radius_arena, central_radius)
+    name_static = f'{name}_static'
+    name_beh = f'{name}_beh'
+
+    with profiler.measure('load cache'):
+        keypoints, found = cache.load_keypoints()
+        frame_numbers = np.flatnonzero(found) + 1
+        keypoints = np.asarray(keypoints[found], dtype=np.int64)
+        probs = cache.load_probs()
+
+    with profiler.measure('session analytics', len(frame_numbers)):
+        rows = SessionAnalytics(info_arena, meta['fps']).calculate(frame_numbers, keypoints)
+
+    with profiler.measure('csv io'):
+        with CSVWriterSession() as csv_session:
+            writer_static = csv_session.open('static', f'{name_static}.csv', STATIC_CSV_HEADER)
+            for row in rows:
+                writer_static.writerow(row)
+            writer_beh = csv_session.open('behavior', f'{name_beh}.csv', meta['behaviors'])
+            for row in probs.tolist():
+                writer_beh.writerow(row)
+
+    with profiler.measure('combine'):
+        csv_combiner = CSVCombiner(name_static, name_beh, meta['shift'], export_format, block_size)
+        session_data = csv_combiner.combine()
+
+    if do_plot_graphs:
+        with profiler.measure('plot'):
+            Plotter(name_beh, info_arena['radius_arena'], plot_profile, plot_vector_formats, plot_workers,
+                    df=session_data, bouts=csv_combiner.bouts, do_decimate=do_decimate_plots).plot()
+    return profiler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rebuild the tables and the plots of a video from its raw cache')
+    parser.add_argument('video', help='video path or name, e.g. test114_1.mp4')
+    parser.add_argument('--radius-arena', type=int, help='override the arena radius, px')
+    parser.add_argument('--central-radius', type=int, help='override the radius of the central zone, px')
+    parser.add_argument('--export-format', choices=EXPORT_FORMATS, default=DEFAULT_EXPORT_FORMAT)
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE, help='rows in a block of the ethogram smoothing')
+    parser.add_argument('--no-plots', action='store_true')
+    parser.add_argument('--plot-profile', choices=tuple(PLOT_PROFILES), default=DEFAULT_PLOT_PROFILE)
+    parser.add_argument('--plot-vector-formats', nargs='*', choices=VECTOR_FORMATS, default=[])
+    parser.add_argument('--plot-workers', type=int, help='processes rendering the plots, 2 by default')
+    parser.add_argument('--decimate-plots', action='store_true')
+    args = parser.parse_args()
+
+    profiler = reanalyze(os.path.basename(args.video).split('.')[0], args.radius_arena, args.central_radius,
+                         not args.no_plots, export_format=args.export_format, block_size=args.block_size,
+                         plot_profile=args.plot_profile, plot_vector_formats=tuple(args.plot_vector_formats),
+                         plot_workers=args.plot_workers, do_decimate_plots=args.decimate_plots)
+    profiler.print_report()
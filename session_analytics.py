@@ -0,0 +1,108 @@
+import numpy as np
+
+from calculator import EPS_FOR_LENGTH_VECTORS
+from calculator_speed import RADUIS_ARENA_IN_METERS
+from keypoint_store import KEYPOINT_NAMES
+
+INDEX_NOSE = KEYPOINT_NAMES.index('point_nose')
+INDEX_NEAR = KEYPOINT_NAMES.index('point_near')
+INDEX_TAIL = KEYPOINT_NAMES.index('point_tail')
+ZONES = ('central_zone', 'internal_zone', 'middle_zone', 'outer_zone')
+STATIC_CSV_HEADER = ['Time, m:s', 'X, px', 'Y, px', 'Central zone', 'Internal zone', 'Middle zone', 'Outer zone',
+                     'Angle btw head&body, degrees', 'Speed, m/s']
+
+
+# Vectorized version of Calculator and CalculatorSpeed for a whole session: every method works on
+# arrays of found frames and repeats the integer and float operations of the per-frame classes
+class SessionAnalytics:
+    def __init__(self, info_arena: dict, fps: float):
+        self.info_arena = info_arena
+        self.fps = fps
+
+    def calculate(self, frame_numbers: np.ndarray, keypoints: np.ndarray) -> list:
+        x_mouse, y_mouse = self.calculate_xy_mouse(keypoints)
+        zoning = self.calculate_zone_mouse(keypoints)
+        angles = self.calculate_angle_head_body(keypoints)
+        speeds = self.calculate_speed(frame_numbers, keypoints)
+        times = self.calculate_time_frames(frame_numbers)
+
+        columns = [x_mouse.tolist(), y_mouse.tolist()] + [zone.tolist() for zone in zoning.T] + \
+                  [angles.tolist(), speeds.tolist()]
+        return [[time] + list(values) for time, values in zip(times, zip(*columns))]
+
+    def calculate_center_of_mouse(self, keypoints: np.ndarray) -> np.ndarray:
+        nose = keypoints[:, INDEX_NOSE]
+        near = keypoints[:, INDEX_NEAR]
+        tail = keypoints[:, INDEX_TAIL]
+        center_head = nose // 2 + near // 2
+        center_body = near // 2 + tail // 2
+        return center_head // 2 + center_body // 2
+
+    def change_coordinate_system(self, points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        new_x = points[..., 0] - self.info_arena['x_center']
+        new_y = self.info_arena['y_center'] - points[..., 1]
+        return new_x, new_y
+
+    def calculate_xy_mouse(self, keypoints: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return self.change_coordinate_system(self.calculate_center_of_mouse(keypoints))
+
+    def calculate_zone_mouse(self, keypoints: np.ndarray) -> np.ndarray:
+        new_x, new_y = self.change_coordinate_system(keypoints)
+        distance = np.sqrt(new_x ** 2 + new_y ** 2)
+
+        counts = np.zeros((len(keypoints), len(ZONES)), dtype=np.int64)
+        for index, zone in enumerate(ZONES):
+            r_min, r_max = self.info_arena[zone]
+            counts[:, index] = ((r_min < distance) & (distance < r_max)).sum(axis=1)
+
+        zoning = np.zeros(counts.shape, dtype=bool)
+        zoning[np.arange(len(counts)), counts.argmax(axis=1)] = True
+        return zoning
+
+    def calculate_angle_head_body(self, keypoints: np.ndarray) -> np.ndarray:
+        vector_body = keypoints[:, INDEX_NEAR] - keypoints[:, INDEX_TAIL]
+        vector_head = keypoints[:, INDEX_NOSE] - keypoints[:, INDEX_NEAR]
+
+        length_vector_body = np.sqrt((vector_body ** 2).sum(axis=1))
+        length_vector_head = np.sqrt((vector_head ** 2).sum(axis=1))
+
+        dot = vector_body[:, 0] * vector_head[:, 0] + vector_body[:, 1] * vector_head[:, 1]
+        det = - vector_body[:, 0] * vector_head[:, 1] + vector_body[:, 1] * vector_head[:, 0]
+        angle = np.degrees(np.arctan2(det, dot))
+        angle = np.where(angle < 0, angle + 360, angle)
+
+        is_degenerate = (length_vector_body < EPS_FOR_LENGTH_VECTORS) | (length_vector_head < EPS_FOR_LENGTH_VECTORS)
+        angle = np.where(is_degenerate, 0, angle)
+        return np.round(angle).astype(np.int64)
+
+    def calculate_length_mouse_in_px(self, keypoints: np.ndarray) -> np.ndarray:
+        vector_body = keypoints[:, INDEX_NEAR] - keypoints[:, INDEX_TAIL]
+        vector_head = keypoints[:, INDEX_NEAR] - keypoints[:, INDEX_NOSE]
+        return np.sqrt((vector_body ** 2).sum(axis=1)) + np.sqrt((vector_head ** 2).sum(axis=1))
+
+    def calculate_speed(self, frame_numbers: np.ndarray, keypoints: np.ndarray) -> np.ndarray:
+        speeds = np.zeros(len(frame_numbers), dtype=np.float64)
+        if len(frame_numbers) < 2:
+            return speeds
+
+        centers = self.calculate_center_of_mouse(keypoints)
+        shift = np.diff(centers, axis=0)
+        distance = np.sqrt(shift[:, 0] ** 2 + shift[:, 1] ** 2)
+        times = frame_numbers / self.fps
+        speed_px_per_seconds = distance / np.diff(times)
+
+        one_px_in_meters = RADUIS_ARENA_IN_METERS / self.info_arena['radius_arena']
+        length_mouse_in_px = self.calculate_length_mouse_in_px(keypoints[1:])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            length_mouse_in_meters = length_mouse_in_px * one_px_in_meters
+            speed = (length_mouse_in_meters / length_mouse_in_px) * speed_px_per_seconds
+
+        speeds[1:] = np.round(speed, 3)
+        return speeds
+
+    def calculate_time_frames(self, frame_numbers: np.ndarray) -> list:
+        times = []
+        for current_time_seconds in (frame_numbers / self.fps).tolist():
+            minutes, seconds = divmod(current_time_seconds, 60)
+            times.append(f'{int(minutes):02d}:{seconds:05.2f}'.replace('.', ','))
+        return times
@@ -0,0 +1,93 @@
+import importlib.util
+import os
+
+import pandas as pd
+
+EXPORT_FORMATS = ('parquet', 'feather', 'csv.gz', 'xlsx')
+DEFAULT_EXPORT_FORMAT = 'parquet'
+FALLBACK_EXPORT_FORMAT = 'csv.gz'
+REQUIRED_MODULES = {'parquet': 'pyarrow', 'feather': 'pyarrow', 'csv.gz': None, 'xlsx': 'openpyxl'}
+
+
+def is_format_available(export_format: str) -> bool:
+    module = REQUIRED_MODULES[export_format]
+    return module is None or importlib.util.find_spec(module) is not None
+
+
+def get_path_session_data(name: str, export_format: str) -> str:
+    return os.path.join('mouse_data', f'{name}_data.{export_format}')
+
+
+def get_export_format(path: str) -> str:
+    for export_format in EXPORT_FORMATS:
+        if path.endswith(f'.{export_format}'):
+            return export_format
+    raise ValueError(f"[ERROR]: Unknown format of the session data {path}, expected one of {EXPORT_FORMATS}")
+
+
+def resolve_export_format(export_format: str) -> str:
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"[ERROR]: Unknown export format {export_format}, expected one of {EXPORT_FORMATS}")
+    if not is_format_available(export_format):
+        print(f'[WARNING]: {REQUIRED_MODULES[export_format]} is not installed, '
+              f'the session data is saved as {FALLBACK_EXPORT_FORMAT}')
+        return FALLBACK_EXPORT_FORMAT
+    return export_format
+
+
+def write_session_data(df: pd.DataFrame, path: str, export_format: str):
+    if export_format == 'parquet':
+        df.to_parquet(path, index=False)
+    elif export_format == 'feather':
+        df.reset_index(drop=True).to_feather(path)
+    elif export_format == 'csv.gz':
+        df.to_csv(path, index=False, compression='gzip')
+    else:
+        df.to_excel(path, index=False)
+
+
+def read_session_data(path: str, export_format: str) -> pd.DataFrame:
+    if export_format == 'parquet':
+        return pd.read_parquet(path)
+    if export_format == 'feather':
+        return pd.read_feather(path)
+    if export_format == 'csv.gz':
+        return pd.read_csv(path, compression='gzip')
+    return pd.read_excel(path)
+
+
+def save_session_data(df: pd.DataFrame, name: str, export_format: str = DEFAULT_EXPORT_FORMAT) -> str:
+    export_format = resolve_export_format(export_format)
+    os.makedirs('mouse_data', exist_ok=True)
+    path = get_path_session_data(name, export_format)
+    write_session_data(df, path, export_format)
+    return path
+
+
+# The newest artifact of the session; a workbook made on request is used only when there is nothing else
+def find_session_data(name: str):
+    paths = [(get_path_session_data(name, export_format), export_format) for export_format in EXPORT_FORMATS]
+    paths = [(path, export_format) for path, export_format in paths if os.path.exists(path)]
+    if not paths:
+        return None, None
+    columnar_paths = [(path, export_format) for path, export_format in paths if export_format != 'xlsx']
+    return max(columnar_paths or paths, key=lambda item: os.path.getmtime(item[0]))
+
+
+def load_session_data(name: str) -> pd.DataFrame:
+    path, export_format = find_session_data(name)
+    if path is None:
+        raise ValueError(f"[ERROR]: No session data for {name} in mouse_data")
+    return read_session_data(path, export_format)
+
+
+# The workbook is built from the session artifact only when it is asked for, and reused while it is newer
+def export_excel(name: str) -> str:
+    path_excel = get_path_session_data(name, 'xlsx')
+    path, export_format = find_session_data(name)
+    if path is None:
+        raise ValueError(f"[ERROR]: No session data for {name} in mouse_data")
+    if export_format != 'xlsx' and (not os.path.exists(path_excel) or
+                                    os.path.getmtime(path_excel) < os.path.getmtime(path)):
+        write_session_data(read_session_data(path, export_format), path_excel, 'xlsx')
+    return path_excel
@@ -0,0 +1,153 @@
+import queue
+import threading
+import time
+
+from contextlib import nullcontext
+
+import cv2
+import numpy as np
+
+from keypoint_store import KEYPOINT_NAMES
+
+DEFAULT_FOURCC = 'H264'
+DEFAULT_ENCODER_QUEUE_SIZE = 16
+TIMEOUT_QUEUE_SECONDS = 0.1
+ARENA_CENTER_COLOR = (0, 0, 255)
+ZONE_COLORS = {'central_zone': (0, 0, 255), 'internal_zone': (0, 255, 0), 'middle_zone': (255, 0, 0),
+               'outer_zone': (255, 0, 255)}
+SKELETON_EDGES = (('point_nose', 'point_r_ear'), ('point_nose', 'point_l_ear'), ('point_r_ear', 'point_near'),
+                  ('point_l_ear', 'point_near'), ('point_near', 'point_r_side'), ('point_near', 'point_l_side'),
+                  ('point_l_side', 'point_tail'), ('point_r_side', 'point_tail'))
+SKELETON_COLOR = (0, 255, 255)
+KEYPOINT_COLORS = {'point_nose': (0, 0, 255), 'point_r_ear': (0, 255, 0), 'point_l_ear': (0, 255, 0),
+                   'point_near': (0, 0, 255), 'point_r_side': (255, 0, 0), 'point_l_side': (255, 0, 0),
+                   'point_tail': (0, 0, 255)}
+
+
+# Draws the overlay and writes the debug video in its own thread. The frames come through a bounded queue,
+# so a slow codec holds the main loop back instead of piling up frames in memory.
+# The arena zones do not move, so they are drawn once and copied into every frame by the pixel indices
+class VideoEncoder:
+    def __init__(self, path: str, fps: float, frame_size: tuple, output_size: tuple = None, frame_skip: int = 1,
+                 fourcc: str = DEFAULT_FOURCC, queue_size: int = DEFAULT_ENCODER_QUEUE_SIZE, profiler=None):
+        if frame_skip < 1:
+            raise ValueError(f"[ERROR]: Frame skip must be positive, got {frame_skip}")
+        if queue_size < 1:
+            raise ValueError(f"[ERROR]: Queue size must be positive, got {queue_size}")
+        if len(fourcc) != 4:
+            raise ValueError(f"[ERROR]: Fourcc must have 4 characters, got {fourcc}")
+
+        self.path = path
+        self.frame_size = tuple(frame_size)
+        self.output_size = tuple(output_size) if output_size is not None else self.frame_size
+        self.scale = np.array([self.output_size[0] / self.frame_size[0], self.output_size[1] / self.frame_size[1]])
+        self.frame_skip = frame_skip
+        self.fourcc = fourcc
+        self.profiler = profiler
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps / frame_skip, self.output_size)
+        if not self.writer.isOpened():
+            print(f'[WARNING]: Could not open the video writer {path} with fourcc {fourcc}')
+
+        self.edges = np.array([[KEYPOINT_NAMES.index(start), KEYPOINT_NAMES.index(end)]
+                               for start, end in SKELETON_EDGES])
+        self.keypoint_colors = [KEYPOINT_COLORS[name] for name in KEYPOINT_NAMES]
+        self.overlay_indices = None
+        self.overlay_pixels = None
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.error = None
+        self.count_written = 0
+        self.count_skipped = 0
+        self.queue_wait_time = 0.0
+
+    def start(self, info_arena: dict):
+        self.render_arena_overlay(info_arena)
+        self.thread = threading.Thread(target=self.run, name='video-encoder', daemon=True)
+        self.thread.start()
+
+    def render_arena_overlay(self, info_arena: dict):
+        width, height = self.output_size
+        overlay = np.zeros((height, width, 3), dtype=np.uint8)
+        mask = np.zeros((height, width), dtype=np.uint8)
+        center = tuple(int(round(value)) for value in
+                       np.array([info_arena['x_center'], info_arena['y_center']]) * self.scale)
+        radius_scale = self.scale.mean()
+        for image, color in ((overlay, None), (mask, 255)):
+            for zone, zone_color in ZONE_COLORS.items():
+                radius = int(round(info_arena[zone][1] * radius_scale))
+                cv2.circle(image, center, radius, zone_color if color is None else color, 2)
+            cv2.circle(image, center, 2, ARENA_CENTER_COLOR if color is None else color, -1)
+
+        self.overlay_indices = np.flatnonzero(mask)
+        self.overlay_pixels = overlay.reshape(-1, 3)[self.overlay_indices]
+
+    # The encoder owns the frame after this call and draws on it
+    def write(self, frame_number: int, frame: np.ndarray, info_mouse: dict):
+        if self.error is not None:
+            raise self.error
+        if (frame_number - 1) % self.frame_skip != 0:
+            self.count_skipped += 1
+            return
+
+        start = time.perf_counter()
+        item = (frame, info_mouse)
+        while True:
+            try:
+                self.queue.put(item, timeout=TIMEOUT_QUEUE_SECONDS)
+                break
+            except queue.Full:
+                if not self.thread.is_alive():
+                    raise self.error if self.error is not None else \
+                        RuntimeError("[ERROR]: Video encoder thread stopped")
+        self.queue_wait_time += time.perf_counter() - start
+
+    def run(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                frame, info_mouse = item
+                with self.measure('draw'):
+                    frame = self.draw(frame, info_mouse)
+                with self.measure('video encoding'):
+                    self.writer.write(frame)
+                self.count_written += 1
+        except Exception as error:
+            self.error = error
+
+    def measure(self, name: str):
+        return self.profiler.measure(name) if self.profiler is not None else nullcontext()
+
+    def draw(self, frame: np.ndarray, info_mouse: dict) -> np.ndarray:
+        if self.output_size != self.frame_size:
+            frame = cv2.resize(frame, self.output_size, interpolation=cv2.INTER_AREA)
+        frame.reshape(-1, 3)[self.overlay_indices] = self.overlay_pixels
+
+        if len(info_mouse) != 0:
+            keypoints = np.rint(np.array([info_mouse[name][:2] for name in KEYPOINT_NAMES], dtype=np.float64) *
+                                self.scale).astype(np.int32)
+            cv2.polylines(frame, list(keypoints[self.edges]), False, SKELETON_COLOR, 2)
+            for point, color in zip(keypoints.tolist(), self.keypoint_colors):
+                cv2.circle(frame, point, 3, color, -1)
+        return frame
+
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.writer.release()
+        if self.error is not None:
+            raise self.error
+
+    def report(self) -> dict:
+        return {
+            'path': self.path,
+            'fourcc': self.fourcc,
+            'size': list(self.output_size),
+            'frame_skip': self.frame_skip,
+            'frames_written': self.count_written,
+            'frames_skipped': self.count_skipped,
+            'queue_wait_s': round(self.queue_wait_time, 3)
+        }
@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+
+DEFAULT_QUEUE_SIZE = 4
+TIMEOUT_QUEUE_SECONDS = 0.1
+
+
+class PipelineStage:
+    def __init__(self, name, function, input_queue, output_queue):
+        self.name = name
+        self.function = function
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+
+        self.count_items = 0
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+
+
+# The first stage is a source: it is called without arguments and returns None at the end of the stream.
+# Every next stage gets the item of the previous one. One thread per stage keeps the items in order,
+# and a full queue blocks the stage that feeds it.
+class VideoPipeline:
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        if queue_size < 1:
+            raise ValueError(f"[ERROR]: Queue size must be positive, got {queue_size}")
+
+        self.queue_size = queue_size
+        self.stages = []
+        self.stop_event = threading.Event()
+        self.error = None
+        self.error_stage = None
+        self.wall_time = 0.0
+
+    def add_stage(self, name, function):
+        input_queue = self.stages[-1].output_queue if self.stages else None
+        output_queue = queue.Queue(maxsize=self.queue_size)
+        self.stages.append(PipelineStage(name, function, input_queue, output_queue))
+
+    def run(self):
+        if not self.stages:
+            raise ValueError("[ERROR]: Pipeline has no stages")
+
+        threads = [threading.Thread(target=self.run_stage, args=(stage,), name=f'pipeline-{stage.name}', daemon=True)
+                   for stage in self.stages]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.wall_time = time.perf_counter() - start
+
+        if self.error is not None:
+            print(f'[ERROR]: Pipeline stage "{self.error_stage}" failed')
+            raise self.error
+
+    def run_stage(self, stage: PipelineStage):
+        is_source = stage.input_queue is None
+        is_sink = stage is self.stages[-1]
+        try:
+            while not self.stop_event.is_set():
+                if is_source:
+                    item = None
+                else:
+                    start_wait = time.perf_counter()
+                    item = self.get(stage.input_queue)
+                    stage.wait_time += time.perf_counter() - start_wait
+                    if item is None:
+                        break
+
+                start_busy = time.perf_counter()
+                result = stage.function() if is_source else stage.function(item)
+                stage.busy_time += time.perf_counter() - start_busy
+
+                if is_source and result is None:
+                    break
+                stage.count_items += 1
+
+                if not is_sink:
+                    start_wait = time.perf_counter()
+                    self.put(stage.output_queue, result)
+                    stage.wait_time += time.perf_counter() - start_wait
+        except BaseException as error:
+            self.fail(stage, error)
+        finally:
+            if not is_sink:
+                self.put(stage.output_queue, None)
+
+    def fail(self, stage: PipelineStage, error: BaseException):
+        if self.error is None:
+            self.error = error
+            self.error_stage = stage.name
+        self.stop_event.set()
+
+    def put(self, output_queue: queue.Queue, item):
+        while True:
+            try:
+                output_queue.put(item, timeout=TIMEOUT_QUEUE_SECONDS)
+                return
+            except queue.Full:
+                if self.stop_event.is_set():
+                    return
+
+    def get(self, input_queue: queue.Queue):
+        while True:
+            try:
+                return input_queue.get(timeout=TIMEOUT_QUEUE_SECONDS)
+            except queue.Empty:
+                if self.stop_event.is_set():
+                    return None
+
+    def report(self) -> dict:
+        report = {}
+        for stage in self.stages:
+            utilization = stage.busy_time / self.wall_time if self.wall_time > 0 else 0.0
+            report[stage.name] = {
+                'items': stage.count_items,
+                'busy_time': round(stage.busy_time, 3),
+                'wait_time': round(stage.wait_time, 3),
+                'utilization': round(utilization, 3)
+            }
+        return report
+
+    def print_report(self):
+        print(f'Pipeline wall time: {self.wall_time:.2f} s')
+        for name, stats in self.report().items():
+            print(f'  {name:<10} items: {stats["items"]:>7}  busy: {stats["busy_time"]:>8.2f} s  '
+                  f'wait: {stats["wait_time"]:>8.2f} s  utilization: {stats["utilization"] * 100:5.1f}%')